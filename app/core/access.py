@@ -0,0 +1,55 @@
+"""
+Access index for shared folders.
+
+Every item stores its ancestor folder ids (FileSystemItem.ancestors), and sharing
+a folder writes an AccessGrant per collaborator. "May this user open item X"
+is then one indexed lookup: a grant for the user on X or any ancestor of X,
+instead of walking parent_ids on each request. The folder owner gets an owner
+grant as well, so they keep access to whatever collaborators add inside.
+"""
+from typing import List, Optional
+
+from beanie.operators import In
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.db.models import AccessGrant, FileSystemItem, User, grant_op
+
+async def ancestors_for(parent_id: Optional[str]) -> List[str]:
+    """The ancestors list of a new child of parent_id."""
+    if not parent_id: return []
+    parent = None
+    if ObjectId.is_valid(parent_id):
+        parent = await FileSystemItem.get_pymongo_collection().find_one({"_id": ObjectId(parent_id)}, {"ancestors": 1})
+    return (parent.get("ancestors", []) if parent else []) + [parent_id]
+
+async def has_access(phone: str, item) -> bool:
+    """Works for documents and listing-cache rows alike; owners and direct collaborators need no lookup."""
+    if item.owner_phone == phone or phone in item.collaborators: return True
+    grant = await AccessGrant.find_one(AccessGrant.user_phone == phone, In(AccessGrant.folder_id, [*item.ancestors, str(item.id)]))
+    return grant is not None
+
+async def granted_roots(phone: str) -> List[str]:
+    grants = await AccessGrant.find(AccessGrant.user_phone == phone, AccessGrant.role == "collaborator").to_list()
+    return [g.folder_id for g in grants]
+
+async def grant(folder: FileSystemItem, phone: str):
+    ops = [grant_op(str(folder.id), folder.owner_phone, folder.owner_phone, "owner"), grant_op(str(folder.id), folder.owner_phone, phone)]
+    try:
+        await AccessGrant.get_pymongo_collection().bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # A concurrent request inserted the same grant first.
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])): raise
+
+async def revoke(folder: FileSystemItem, phone: str):
+    await AccessGrant.find(AccessGrant.user_phone == phone, AccessGrant.folder_id == str(folder.id), AccessGrant.role == "collaborator").delete()
+
+async def drop_grants(items: List[FileSystemItem]):
+    folder_ids = [str(i.id) for i in items if i.is_folder]
+    if folder_ids: await AccessGrant.find(In(AccessGrant.folder_id, folder_ids)).delete()
+
+async def owner_session(owner_phone: str, user: User) -> Optional[str]:
+    """Files live in their uploader's Saved Messages, so collaborators read them with the owner's session."""
+    if owner_phone == user.phone_number: return user.session_string
+    owner = await User.find_one(User.phone_number == owner_phone)
+    return owner.session_string if owner else None
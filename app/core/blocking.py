@@ -0,0 +1,53 @@
+"""
+Keeps blocking filesystem and compression work off the event loop, and watches
+for anything that still blocks it.
+
+run_blocking() uses a small dedicated pool so a burst of zip builds can't take
+every thread from the default executor (which Starlette's UploadFile and
+aiofiles also use). The lag monitor measures how late the loop wakes up from a
+short sleep; with LOOP_DEBUG asyncio itself also names slow callbacks.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 0.25
+
+_executor = ThreadPoolExecutor(max_workers=settings.BLOCKING_IO_WORKERS, thread_name_prefix="mxm-io")
+_monitor_task: Optional[asyncio.Task] = None
+
+async def run_blocking(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(_executor, partial(func, *args, **kwargs))
+
+async def _watch_lag():
+    loop = asyncio.get_running_loop()
+    threshold = settings.LOOP_LAG_WARN_MS / 1000
+    while True:
+        start = loop.time()
+        await asyncio.sleep(CHECK_INTERVAL)
+        lag = max(loop.time() - start - CHECK_INTERVAL, 0)
+        LOOP_LAG.observe(lag)
+        if lag > threshold:
+            logger.warning(f"Event loop was blocked for {lag * 1000:.0f} ms")
+
+def start_monitor():
+    global _monitor_task
+    loop = asyncio.get_running_loop()
+    if settings.LOOP_DEBUG:
+        # asyncio logs "Executing <Task ...> took X seconds" for each offender.
+        loop.set_debug(True)
+        loop.slow_callback_duration = settings.LOOP_LAG_WARN_MS / 1000
+    if not _monitor_task:
+        _monitor_task = asyncio.create_task(_watch_lag())
+
+def stop_monitor():
+    global _monitor_task
+    if _monitor_task: _monitor_task.cancel()
+    _monitor_task = None
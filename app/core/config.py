@@ -14,6 +14,43 @@ class Settings(BaseSettings):
     # CHANGED: Replaced ADMIN_EMAIL with ADMIN_PHONE
     ADMIN_PHONE: str 
 
+    # Optional bearer token protecting /metrics (leave empty for open scraping)
+    METRICS_TOKEN: str = ""
+
+    # Connect the shared Telegram client in the background at startup instead of on first use
+    TELEGRAM_WARMUP: bool = False
+
+    # Download tuning (see app/core/transfer.py)
+    TRANSFER_FIRST_REQUEST: int = 128 * 1024  # first getFile size for playback, must be a power of two
+    TRANSFER_PREFETCH: int = 2                # playback requests kept in flight
+    TRANSFER_BULK_PARALLEL: int = 4           # zip/export requests kept in flight
+
+    # On-demand HLS (see app/core/hls.py)
+    HLS_CACHE_DIR: str = ""                   # defaults to <tmp>/mxm_hls
+    HLS_CACHE_MAX_BYTES: int = 2 * 1024 ** 3
+    HLS_SEGMENT_SECONDS: int = 6
+    HLS_READY_TIMEOUT: int = 60               # seconds a player waits for the first segment
+    HLS_MAX_BUILDS: int = 1                   # concurrent ffmpeg builds; beyond that players stay progressive
+
+    # In-memory cache of MP4 moov / MKV headers served to range probes
+    MEDIA_HEADER_CACHE_BYTES: int = 64 * 1024 * 1024
+
+    # Blocking file work and event loop monitoring (see app/core/blocking.py)
+    BLOCKING_IO_WORKERS: int = 4              # threads for zip builds, tree removal, ...
+    LOOP_LAG_WARN_MS: int = 100               # log when the event loop is blocked longer than this
+    LOOP_DEBUG: bool = False                  # asyncio debug mode: names the slow callback (adds overhead)
+
+    # Per-process dashboard listing cache (see app/core/listing_cache.py)
+    LISTING_CACHE_BYTES: int = 16 * 1024 * 1024
+    LISTING_CACHE_TTL: int = 300              # seconds; bounds staleness across workers
+
+    # Background integrity scrubber (see app/core/scrubber.py)
+    SCRUB_ENABLED: bool = True
+    SCRUB_INTERVAL: int = 6 * 3600            # seconds between full passes
+    SCRUB_BATCH_SIZE: int = 200
+    SCRUB_BATCH_PAUSE: float = 2.0            # seconds slept between batches
+    SCRUB_TEMP_MAX_AGE: int = 24 * 3600       # leftover upload/zip temp files older than this are removed
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,156 @@
+"""
+On-demand HLS for Telegram-hosted video.
+
+The first request for an item starts ffmpeg on a loopback range URL
+(transfer.serve_local), so segmenting begins with the first bytes from Telegram
+and the playlist is usable after a few seconds rather than after a full
+download. Segments are fMP4 chunks kept on disk; players then fetch small
+segments instead of reopening a Telegram stream on every seek. The cache is
+bounded by HLS_CACHE_MAX_BYTES and evicts least recently used items.
+
+A build reads the whole file and may transcode, so it is only offered where
+progressive playback falls short (see worth_segmenting), and at most
+HLS_MAX_BUILDS run at once; other players keep using Range requests.
+"""
+import os
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from typing import Dict
+
+from app.core.config import settings
+from app.core.telegram_bot import user_client, connect_client, disconnect_client
+from app.core.transfer import serve_local, get_media
+from app.core.blocking import run_blocking
+from app.core.metrics import track_telegram, HLS_BUILDS, HLS_BUILD_DURATION, HLS_CACHE_BYTES
+from app.db.models import FileSystemItem
+from app.utils.ffmpeg_utils import segment_hls
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST = "index.m3u8"
+DONE_MARKER = ".complete"
+
+_builds: Dict[str, asyncio.Task] = {}
+_slots = asyncio.Semaphore(settings.HLS_MAX_BUILDS)
+
+class HLSError(Exception):
+    pass
+
+class HLSBusy(HLSError):
+    pass
+
+def cache_root() -> str:
+    return settings.HLS_CACHE_DIR or os.path.join(tempfile.gettempdir(), "mxm_hls")
+
+def item_dir(item_id: str) -> str:
+    return os.path.join(cache_root(), item_id)
+
+def is_complete(item_id: str) -> bool:
+    return os.path.exists(os.path.join(item_dir(item_id), DONE_MARKER))
+
+def worth_segmenting(item: FileSystemItem) -> bool:
+    """Faststart MP4s already play and seek progressively; HLS is for everything else."""
+    index = item.media_index
+    return not index or index.container != "mp4" or not index.faststart
+
+def can_serve(item_id: str) -> bool:
+    """True if the playlist exists, is being built, or a build slot is free."""
+    return item_id in _builds or is_complete(item_id) or not _slots.locked()
+
+def _has_segment(item_id: str) -> bool:
+    path = os.path.join(item_dir(item_id), PLAYLIST)
+    if not os.path.exists(path): return False
+    with open(path) as f: return "#EXTINF" in f.read()
+
+async def _build(item: FileSystemItem, session_string: str):
+    item_id = str(item.id)
+    out_dir = item_dir(item_id)
+    await run_blocking(shutil.rmtree, out_dir, ignore_errors=True)
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    try:
+        client = await connect_client(user_client("hls", session_string))
+        try:
+            with track_telegram("get_messages"):
+                msg = await client.get_messages("me", message_ids=item.parts[0].message_id)
+            media = get_media(msg)
+            if not media: raise HLSError("Media not found on Telegram")
+            async with serve_local(client, media) as url:
+                ok = await segment_hls(url, out_dir, settings.HLS_SEGMENT_SECONDS)
+        finally:
+            await disconnect_client(client)
+        if not ok: raise HLSError("ffmpeg could not segment this file")
+        open(os.path.join(out_dir, DONE_MARKER), "w").close()
+        HLS_BUILDS.labels("completed").inc()
+    except BaseException:
+        HLS_BUILDS.labels("failed").inc()
+        await run_blocking(shutil.rmtree, out_dir, ignore_errors=True)
+        raise
+    finally:
+        HLS_BUILD_DURATION.observe(time.perf_counter() - started)
+        _builds.pop(item_id, None)
+        _slots.release()
+    await run_blocking(evict)
+
+def _log_failure(task: asyncio.Task):
+    # Also marks the exception as retrieved if the requesting player went away.
+    if not task.cancelled() and task.exception():
+        logger.error(f"HLS build failed: {task.exception()}")
+
+async def ensure_playlist(item: FileSystemItem, session_string: str) -> str:
+    """
+    Returns the playlist path once it lists at least one segment. The playlist is an
+    EVENT playlist, so players keep polling it while segmenting continues.
+    """
+    item_id = str(item.id)
+    out_dir = item_dir(item_id)
+    if is_complete(item_id):
+        os.utime(out_dir)  # LRU touch
+        return os.path.join(out_dir, PLAYLIST)
+
+    task = _builds.get(item_id)
+    if not task:
+        if _slots.locked(): raise HLSBusy("All HLS build slots are in use")
+        await _slots.acquire()  # free slot, so this returns without yielding
+        task = _builds[item_id] = asyncio.create_task(_build(item, session_string))
+        task.add_done_callback(_log_failure)
+
+    deadline = time.monotonic() + settings.HLS_READY_TIMEOUT
+    while not await run_blocking(_has_segment, item_id):
+        if task.done():
+            if task.cancelled() or task.exception(): raise HLSError(str(task.exception() if not task.cancelled() else "Build cancelled"))
+            break
+        if time.monotonic() > deadline: raise HLSError("Timed out preparing stream")
+        await asyncio.sleep(0.5)
+    return os.path.join(out_dir, PLAYLIST)
+
+def evict():
+    """
+    Drops least recently used finished items until the cache fits HLS_CACHE_MAX_BYTES.
+    Unfinished directories with no running build were left by a crash or restart
+    and are removed outright.
+    """
+    root = cache_root()
+    if not os.path.isdir(root): return
+    entries = []
+    total = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        # _build writes the marker before leaving _builds, so check in this order.
+        if name not in _builds and not os.path.exists(os.path.join(path, DONE_MARKER)):
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"HLS cache dropped partial build {path}")
+            continue
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+        total += size
+        if name not in _builds:
+            entries.append((os.path.getmtime(path), size, path))
+    for _, size, path in sorted(entries):
+        if total <= settings.HLS_CACHE_MAX_BYTES: break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        logger.info(f"HLS cache evicted {path}")
+    HLS_CACHE_BYTES.set(total)
@@ -0,0 +1,171 @@
+"""
+Keeps container indexes (app/utils/media_index.py) for stored videos and caches
+their headers in memory, so moov-at-end probes are answered without opening a
+Telegram stream and time-based seeks map straight to byte offsets.
+"""
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from beanie.operators import RegEx
+from pyrogram import Client
+
+from app.core.config import settings
+from app.core.telegram_bot import user_client, connect_client, disconnect_client
+from app.core.transfer import iter_range, get_media, workload_for_range
+from app.core.metrics import track_telegram, HEADER_CACHE_HITS, HEADER_CACHE_BYTES, MEDIA_INDEXED
+from app.db.models import FileSystemItem, KeyframeTable, MediaIndex, User
+from app.utils.media_index import build_index, file_reader, Reader
+
+logger = logging.getLogger(__name__)
+
+INDEXABLE_EXTENSIONS = (".mp4", ".m4v", ".mov", ".mkv", ".webm")
+
+def is_indexable(mime_type: Optional[str], name: str) -> bool:
+    return (mime_type or "").startswith("video/") or name.lower().endswith(INDEXABLE_EXTENSIONS)
+
+def to_media_index(result: Optional[dict]) -> MediaIndex:
+    if not result: return MediaIndex(container="none")
+    fields = {k: v for k, v in result.items() if k != "keyframes"}
+    return MediaIndex(**fields, keyframe_count=len(result["keyframes"]))
+
+async def save_keyframes(item_id, result: Optional[dict]):
+    if result and result["keyframes"]:
+        await KeyframeTable(id=item_id, keyframes=result["keyframes"]).save()
+
+async def index_local_file(path: str) -> Optional[dict]:
+    """Post-upload step: index the temp file before it is deleted. Returns the raw build_index result."""
+    try:
+        result = await build_index(file_reader(path), os.path.getsize(path))
+    except Exception as e:
+        logger.warning(f"Indexing {path} failed: {e}")
+        result = None
+    MEDIA_INDEXED.labels(result["container"] if result else "none").inc()
+    return result
+
+def telegram_reader(client: Client, media) -> Reader:
+    async def read(offset: int, size: int) -> bytes:
+        end = min(offset + size, media.file_size) - 1
+        if end < offset: return b""
+        return b"".join([chunk async for chunk in iter_range(client, media, offset, end, workload_for_range(offset, end, True))])
+    return read
+
+
+# --- HEADER CACHE ---
+class HeaderCache:
+    """LRU of header bytes per item, bounded by total size."""
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self._data.get(key)
+        if value is not None: self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: bytes):
+        if len(value) > self.max_bytes: return
+        self.pop(key)
+        self._data[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, old = self._data.popitem(last=False)
+            self.size -= len(old)
+        HEADER_CACHE_BYTES.set(self.size)
+
+    def pop(self, key: str):
+        old = self._data.pop(key, None)
+        if old is not None: self.size -= len(old)
+
+header_cache = HeaderCache(settings.MEDIA_HEADER_CACHE_BYTES)
+_header_fetches: Dict[str, asyncio.Task] = {}
+
+def covers_header(index: Optional[MediaIndex], start: int, end: int) -> bool:
+    if not index or not index.header_size: return False
+    return index.header_offset <= start and end < index.header_offset + index.header_size
+
+async def _fetch_header(item: FileSystemItem, session_string: str) -> bytes:
+    index = item.media_index
+    client = await connect_client(user_client("header", session_string))
+    try:
+        with track_telegram("get_messages"):
+            msg = await client.get_messages("me", message_ids=item.parts[0].message_id)
+        media = get_media(msg)
+        if not media: raise ValueError("Media not found on Telegram")
+        return await telegram_reader(client, media)(index.header_offset, index.header_size)
+    finally:
+        await disconnect_client(client)
+
+async def get_header(item: FileSystemItem, session_string: str) -> bytes:
+    """Header bytes from cache, fetching them once (shared by concurrent probes) on a miss."""
+    key = str(item.id)
+    cached = header_cache.get(key)
+    HEADER_CACHE_HITS.labels("hit" if cached is not None else "miss").inc()
+    if cached is not None: return cached
+    task = _header_fetches.get(key)
+    if not task:
+        task = _header_fetches[key] = asyncio.create_task(_fetch_header(item, session_string))
+        task.add_done_callback(lambda t: _header_fetches.pop(key, None))
+    data = await asyncio.shield(task)
+    header_cache.put(key, data)
+    return data
+
+
+# --- BACKFILL ---
+_backfill_task: Optional[asyncio.Task] = None
+
+async def _index_remote(client: Client, item: FileSystemItem):
+    try:
+        with track_telegram("get_messages"):
+            msg = await client.get_messages("me", message_ids=item.parts[0].message_id)
+        media = get_media(msg)
+        result = await build_index(telegram_reader(client, media), media.file_size) if media else None
+    except Exception as e:
+        logger.warning(f"Indexing {item.id} failed: {e}")
+        result = None
+    MEDIA_INDEXED.labels(result["container"] if result else "none").inc()
+    item.media_index = to_media_index(result)
+    await item.save()
+    await save_keyframes(item.id, result)
+
+async def backfill(batch_size: int = 50, concurrency: int = 4):
+    """Indexes existing videos in batches, one Telegram client per owner per batch."""
+    while True:
+        items = await FileSystemItem.find(
+            FileSystemItem.is_folder == False, FileSystemItem.media_index == None,
+            RegEx(FileSystemItem.mime_type, "^video/"),
+        ).limit(batch_size).to_list()
+        if not items: break
+        for item in [i for i in items if not i.parts]:
+            item.media_index = MediaIndex(container="none")
+            await item.save()
+        items = [i for i in items if i.parts]
+
+        by_owner: Dict[str, list] = {}
+        for item in items: by_owner.setdefault(item.owner_phone, []).append(item)
+        for phone, owned in by_owner.items():
+            owner = await User.find_one(User.phone_number == phone)
+            if not owner:
+                for item in owned:
+                    item.media_index = MediaIndex(container="none")
+                    await item.save()
+                continue
+            client = await connect_client(user_client("indexer", owner.session_string))
+            try:
+                sem = asyncio.Semaphore(concurrency)
+                async def run(item):
+                    async with sem: await _index_remote(client, item)
+                await asyncio.gather(*(run(i) for i in owned))
+            finally:
+                await disconnect_client(client)
+        await asyncio.sleep(1)  # stay polite to Telegram between batches
+
+def start_backfill() -> bool:
+    global _backfill_task
+    if _backfill_task and not _backfill_task.done(): return False
+    _backfill_task = asyncio.create_task(backfill())
+    _backfill_task.add_done_callback(lambda t: t.cancelled() or not t.exception() or logger.error(f"Media index backfill failed: {t.exception()}"))
+    return True
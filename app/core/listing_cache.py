@@ -0,0 +1,120 @@
+"""
+Per-process cache of dashboard listings.
+
+An entry holds slim precomputed rows for one folder, or for a user's root
+(owned plus shared root items), never full documents with parts or media
+indexes. Routes that change a listing call invalidate_items()/invalidate(), so
+repeat navigation skips Mongo. Each worker has its own cache; the TTL bounds
+how long a write made on another worker can go unseen.
+"""
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import LISTING_CACHE_HITS, LISTING_CACHE_BYTES
+from app.utils.file_utils import format_size, get_icon_for_mime
+
+ROW_OVERHEAD = 200  # rough bytes for a slotted row plus its small ints/bools
+
+class ListingRow:
+    """What dashboard.html needs from an item, precomputed once."""
+    __slots__ = ("id", "name", "is_folder", "parent_id", "ancestors", "owner_phone", "collaborators",
+                 "mime_type", "size", "formatted_size", "icon", "share_token")
+
+    def __init__(self, item):
+        self.id = str(item.id)
+        self.name = item.name
+        self.is_folder = item.is_folder
+        self.parent_id = item.parent_id
+        self.ancestors = tuple(item.ancestors)
+        self.owner_phone = item.owner_phone
+        self.collaborators = tuple(item.collaborators)
+        self.mime_type = item.mime_type
+        self.size = item.size
+        self.formatted_size = format_size(item.size)
+        self.icon = "fa-folder" if item.is_folder else get_icon_for_mime(item.mime_type)
+        self.share_token = item.share_token or ""
+
+    def nbytes(self) -> int:
+        strings = (self.id, self.name, self.parent_id, self.owner_phone, self.mime_type, self.formatted_size, self.icon, self.share_token)
+        return ROW_OVERHEAD + sum(len(s) for s in strings if s) + sum(len(c) + 8 for c in (*self.ancestors, *self.collaborators))
+
+class Listing:
+    __slots__ = ("folder", "rows", "expires", "nbytes")
+
+    def __init__(self, folder: Optional[ListingRow], rows: Tuple[ListingRow, ...], ttl: float):
+        self.folder = folder
+        self.rows = rows
+        self.expires = time.monotonic() + ttl
+        self.nbytes = sum(r.nbytes() for r in rows) + (folder.nbytes() if folder else 0)
+
+def root_key(phone: str) -> str:
+    return f"root:{phone}"
+
+def listing_key(folder_id: Optional[str], phone: str) -> str:
+    """Folder listings are shared by everyone who can open them; the root is per user."""
+    return folder_id or root_key(phone)
+
+
+class ListingCache:
+    """LRU of listings bounded by estimated size, like indexer.HeaderCache."""
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._data: "OrderedDict[str, Listing]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Listing]:
+        listing = self._data.get(key)
+        if listing is not None and listing.expires < time.monotonic():
+            self.invalidate(key)
+            listing = None
+        LISTING_CACHE_HITS.labels("hit" if listing is not None else "miss").inc()
+        if listing is not None: self._data.move_to_end(key)
+        return listing
+
+    def put(self, key: str, folder, items: Iterable) -> Listing:
+        listing = Listing(ListingRow(folder) if folder else None, tuple(ListingRow(i) for i in items), self.ttl)
+        if listing.nbytes > self.max_bytes: return listing
+        self.invalidate(key)
+        self._data[key] = listing
+        self.size += listing.nbytes
+        while self.size > self.max_bytes:
+            _, old = self._data.popitem(last=False)
+            self.size -= old.nbytes
+        LISTING_CACHE_BYTES.set(self.size)
+        return listing
+
+    def invalidate(self, *keys: str):
+        for key in keys:
+            old = self._data.pop(key, None)
+            if old is not None: self.size -= old.nbytes
+        LISTING_CACHE_BYTES.set(self.size)
+
+    def invalidate_descendants(self, folder_ids: Iterable[str]):
+        """Drops listings of folders anywhere below folder_ids, found through their ancestors."""
+        ids = set(folder_ids)
+        if ids: self.invalidate(*[key for key, listing in self._data.items() if listing.folder and ids.intersection(listing.folder.ancestors)])
+
+    def clear(self):
+        self._data.clear()
+        self.size = 0
+        LISTING_CACHE_BYTES.set(0)
+
+listing_cache = ListingCache(settings.LISTING_CACHE_BYTES, settings.LISTING_CACHE_TTL)
+
+def invalidate_items(items: Iterable, deleted: bool = False):
+    """
+    Drops every listing that shows these items: the parent folder (or the owner's
+    root), the roots of collaborators it is shared with and, for folders, their own.
+    When the items were deleted, listings of folders below them go as well.
+    """
+    keys = set()
+    folders = []
+    for item in items:
+        keys.add(listing_key(item.parent_id, item.owner_phone))
+        keys.update(root_key(p) for p in item.collaborators)
+        if item.is_folder: folders.append(str(item.id))
+    listing_cache.invalidate(*keys, *folders)
+    if deleted: listing_cache.invalidate_descendants(folders)
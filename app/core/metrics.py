@@ -0,0 +1,171 @@
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import AsyncIterator, Optional
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from pymongo import monitoring
+
+# --- METRIC DEFINITIONS ---
+# Buckets are tuned for the two very different scales we care about:
+# quick API/DB calls (ms) and Telegram transfers (seconds).
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+HTTP_LATENCY = Histogram(
+    "mxm_http_request_duration_seconds", "Time until response headers are sent, per route",
+    ["method", "route", "status"], buckets=FAST_BUCKETS + (5.0, 10.0, 30.0)
+)
+HTTP_INFLIGHT = Gauge("mxm_http_requests_inflight", "Requests currently being handled")
+
+STREAM_TTFB = Histogram("mxm_stream_ttfb_seconds", "Time to first byte from Telegram", ["kind"], buckets=SLOW_BUCKETS)
+STREAM_BYTES = Counter("mxm_stream_bytes_total", "Bytes served from Telegram streams", ["kind"])
+STREAM_DURATION = Histogram("mxm_stream_duration_seconds", "Total lifetime of a stream", ["kind"], buckets=SLOW_BUCKETS)
+STREAMS_ACTIVE = Gauge("mxm_streams_active", "Streams currently open", ["kind"])
+
+UPLOAD_BYTES = Counter("mxm_upload_bytes_total", "Bytes pushed to Telegram by background uploads")
+UPLOAD_DURATION = Histogram("mxm_upload_duration_seconds", "Background upload duration", ["status"], buckets=SLOW_BUCKETS)
+UPLOADS_ACTIVE = Gauge("mxm_uploads_active", "Background uploads in progress")
+
+ZIP_BYTES = Counter("mxm_zip_bytes_total", "Bytes of zip archives produced")
+ZIP_DURATION = Histogram("mxm_zip_duration_seconds", "Zip bundle build duration", ["status"], buckets=SLOW_BUCKETS)
+ZIPS_ACTIVE = Gauge("mxm_zips_active", "Zip bundles being built")
+
+TRANSFER_REQUESTS = Counter("mxm_transfer_requests_total", "upload.getFile requests by workload and request size", ["workload", "size"])
+TRANSFER_LATENCY = Histogram("mxm_transfer_request_duration_seconds", "upload.getFile latency", ["workload"], buckets=FAST_BUCKETS + (5.0, 10.0, 30.0))
+TRANSFER_WASTE = Counter("mxm_transfer_waste_bytes_total", "Bytes fetched for alignment but not served", ["workload"])
+TRANSFER_FALLBACKS = Counter("mxm_transfer_fallbacks_total", "Transfers handed back to pyrogram's stream_media", ["workload", "reason"])
+
+HLS_BUILDS = Counter("mxm_hls_builds_total", "HLS segmenting runs", ["status"])
+HLS_BUILD_DURATION = Histogram("mxm_hls_build_duration_seconds", "Download + segment time per item", buckets=SLOW_BUCKETS)
+HLS_CACHE_BYTES = Gauge("mxm_hls_cache_bytes", "Disk used by the HLS segment cache")
+
+MEDIA_INDEXED = Counter("mxm_media_indexed_total", "Files run through the container indexer", ["container"])
+HEADER_CACHE_HITS = Counter("mxm_header_cache_requests_total", "Header-range requests answered from the cache", ["result"])
+HEADER_CACHE_BYTES = Gauge("mxm_header_cache_bytes", "Bytes held in the media header cache")
+
+LISTING_CACHE_HITS = Counter("mxm_listing_cache_requests_total", "Dashboard listings served from the cache", ["result"])
+LISTING_CACHE_BYTES = Gauge("mxm_listing_cache_bytes", "Estimated bytes held in the listing cache")
+
+SCRUB_ITEMS = Counter("mxm_scrub_items_total", "Items checked by the integrity scrubber", ["result"])
+SCRUB_PURGED = Counter("mxm_scrub_purged_messages_total", "Telegram messages of deleted items removed")
+SCRUB_PASS_DURATION = Histogram("mxm_scrub_pass_duration_seconds", "Duration of a full scrubber pass", buckets=SLOW_BUCKETS + (900.0, 3600.0))
+
+LOOP_LAG = Histogram("mxm_event_loop_lag_seconds", "How late the event loop woke up from a short sleep", buckets=FAST_BUCKETS + (5.0,))
+
+STARTUP_SECONDS = Gauge("mxm_startup_seconds", "Duration of each startup phase", ["phase"])
+
+TG_LATENCY = Histogram("mxm_telegram_call_duration_seconds", "Telegram API call latency", ["method"], buckets=SLOW_BUCKETS)
+TG_ERRORS = Counter("mxm_telegram_call_errors_total", "Failed Telegram API calls", ["method", "error"])
+
+MONGO_LATENCY = Histogram("mxm_mongo_command_duration_seconds", "MongoDB command latency", ["route", "command"], buckets=FAST_BUCKETS)
+MONGO_ERRORS = Counter("mxm_mongo_command_errors_total", "Failed MongoDB commands", ["route", "command"])
+
+# Telegram reads in progress (streams, header fetches, HLS builds, zip exports),
+# counted in transfer.iter_range so background jobs can cheaply back off.
+_active_transfers = 0
+
+def active_transfers() -> int:
+    return _active_transfers
+
+# The ASGI scope of the request being handled. Motor copies contextvars into its
+# executor threads, so the Mongo listener can label commands with their route.
+current_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("mxm_current_scope", default=None)
+
+def route_label(scope: Optional[dict]) -> str:
+    """Route template (e.g. /stream/data/{item_id}) to keep label cardinality bounded."""
+    if not scope: return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+# --- TELEGRAM ---
+@contextmanager
+def track_transfer():
+    global _active_transfers
+    _active_transfers += 1
+    try:
+        yield
+    finally:
+        _active_transfers -= 1
+
+@contextmanager
+def track_telegram(method: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        TG_ERRORS.labels(method, type(e).__name__).inc()
+        raise
+    finally:
+        TG_LATENCY.labels(method).observe(time.perf_counter() - start)
+
+# --- STREAMING ---
+async def instrument_stream(chunks: AsyncIterator[bytes], kind: str) -> AsyncIterator[bytes]:
+    """Wraps a chunk generator with TTFB, byte and duration accounting."""
+    start = time.perf_counter()
+    first = True
+    served = 0
+    STREAMS_ACTIVE.labels(kind).inc()
+    try:
+        async for chunk in chunks:
+            if first:
+                STREAM_TTFB.labels(kind).observe(time.perf_counter() - start)
+                first = False
+            served += len(chunk)
+            yield chunk
+    finally:
+        # One counter update per stream keeps the per-chunk path free of locks.
+        STREAM_BYTES.labels(kind).inc(served)
+        STREAM_DURATION.labels(kind).observe(time.perf_counter() - start)
+        STREAMS_ACTIVE.labels(kind).dec()
+
+# --- HTTP MIDDLEWARE ---
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware) so streamed bodies pass through untouched.
+    Latency is measured until the response headers go out, which for streaming
+    routes is the time the user waits before bytes start flowing.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        token = current_scope.set(scope)
+        recorded = False
+
+        async def send_wrapper(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start" and not recorded:
+                recorded = True
+                HTTP_LATENCY.labels(scope["method"], route_label(scope), str(message["status"])).observe(time.perf_counter() - start)
+            await send(message)
+
+        HTTP_INFLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not recorded:
+                HTTP_LATENCY.labels(scope["method"], route_label(scope), "500").observe(time.perf_counter() - start)
+            raise
+        finally:
+            HTTP_INFLIGHT.dec()
+            current_scope.reset(token)
+
+# --- MONGO ---
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event): pass
+
+    def succeeded(self, event):
+        MONGO_LATENCY.labels(route_label(current_scope.get()), event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        route = route_label(current_scope.get())
+        MONGO_LATENCY.labels(route, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_ERRORS.labels(route, event.command_name).inc()
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,249 @@
+"""
+Background storage integrity scrubber.
+
+Deletes only remove the selected Mongo documents, so a pass walks FileSystemItem
+in _id order, one batch at a time, and
+  - reaps orphans (parent folder or owner gone) together with their subtrees,
+  - checks every FilePart still exists on Telegram with batched get_messages,
+    recording missing messages and size drift on the item,
+  - drains the purge queue, deleting Telegram messages of deleted items,
+  - removes temp files left behind by crashed uploads and zip builds, and
+    HLS cache directories of builds that never finished.
+
+It runs at low priority: batches are spaced out and wait while anyone is streaming.
+"""
+import os
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from beanie import PydanticObjectId
+from beanie.operators import In
+from pyrogram import Client
+
+from app.core.config import settings
+from app.core.telegram_bot import user_client, connect_client, disconnect_client
+from app.core.transfer import get_media
+from app.core.listing_cache import invalidate_items
+from app.core.access import drop_grants
+from app.core.blocking import run_blocking
+from app.core import hls
+from app.core.metrics import active_transfers, track_telegram, SCRUB_ITEMS, SCRUB_PURGED, SCRUB_PASS_DURATION
+from app.db.models import FileSystemItem, IntegrityReport, PurgeEntry, User, queue_purge, delete_keyframes, to_object_ids
+
+logger = logging.getLogger(__name__)
+
+# Temp files are named with these prefixes so leftovers can be told apart from anything else in /tmp.
+UPLOAD_PREFIX = "mxm_upload_"
+ZIP_PREFIX = "mxm_zip_"
+
+MESSAGES_PER_CALL = 100  # Telegram limit for get_messages / delete_messages
+STARTUP_DELAY = 300      # let the worker settle before the first pass
+
+_pass_lock = asyncio.Lock()
+_loop_task: Optional[asyncio.Task] = None
+_tasks: Set[asyncio.Task] = set()
+
+async def _yield_to_users():
+    """Never competes with playback: waits until no stream is open, then pauses between batches."""
+    while active_transfers() > 0:
+        await asyncio.sleep(settings.SCRUB_BATCH_PAUSE)
+    await asyncio.sleep(settings.SCRUB_BATCH_PAUSE)
+
+
+# --- ORPHANS ---
+async def reap_subtrees(roots: List[FileSystemItem]) -> Set[PydanticObjectId]:
+    """Deletes items and all their descendants, level by level, queueing their messages for purge."""
+    reaped = set()
+    level = roots
+    while level:
+        await queue_purge(level)
+        await FileSystemItem.find(In(FileSystemItem.id, [i.id for i in level])).delete()
+        await delete_keyframes(level)
+        reaped.update(i.id for i in level)
+        await drop_grants(level)
+        invalidate_items(level)
+        folder_ids = [str(i.id) for i in level if i.is_folder]
+        level = await FileSystemItem.find(In(FileSystemItem.parent_id, folder_ids)).to_list() if folder_ids else []
+    return reaped
+
+async def _live_folders(items: List[FileSystemItem]) -> Set[str]:
+    parent_ids = list({i.parent_id for i in items if i.parent_id})
+    if not parent_ids: return set()
+    rows = await FileSystemItem.get_pymongo_collection().find(
+        {"_id": {"$in": to_object_ids(parent_ids)}, "is_folder": True}, {"_id": 1}
+    ).to_list(None)
+    return {str(r["_id"]) for r in rows}
+
+
+# --- TELEGRAM CHECKS ---
+async def verify_parts(client: Client, items: List[FileSystemItem]) -> Dict[str, int]:
+    """Checks one owner's files against Telegram and stores an IntegrityReport where something is off."""
+    ids = [p.message_id for item in items for p in item.parts]
+    found: Dict[int, int] = {}
+    for n in range(0, len(ids), MESSAGES_PER_CALL):
+        with track_telegram("get_messages"):
+            messages = await client.get_messages("me", message_ids=ids[n:n + MESSAGES_PER_CALL])
+        for msg in messages:
+            media = get_media(msg)
+            if media: found[msg.id] = media.file_size or 0
+
+    counts = {"ok": 0, "missing": 0, "drift": 0}
+    now = datetime.now()
+    for item in items:
+        missing = [p.message_id for p in item.parts if p.message_id not in found]
+        drift = 0 if missing else sum(found[p.message_id] for p in item.parts) - item.size
+        result = "missing" if missing else "drift" if drift else "ok"
+        counts[result] += 1
+        SCRUB_ITEMS.labels(result).inc()
+        report = IntegrityReport(checked_at=now, missing_messages=missing, size_drift=drift) if result != "ok" else None
+        if report or item.integrity:
+            await item.set({FileSystemItem.integrity: report})
+    return counts
+
+async def drain_purges(phone: str, session_string: str) -> int:
+    """Deletes the queued Telegram messages of one owner; returns how many were removed."""
+    entries = await PurgeEntry.find(PurgeEntry.owner_phone == phone).to_list()
+    if not entries: return 0
+    ids = sorted({m for e in entries for m in e.message_ids})
+    # Never delete a message some live item still points at. Those ids stay queued:
+    # the item may be a delete that hasn't landed yet, so the next pass checks again.
+    live = set(await FileSystemItem.get_pymongo_collection().distinct(
+        "parts.message_id", {"owner_phone": phone, "parts.message_id": {"$in": ids}}
+    ))
+    ids = [m for m in ids if m not in live]
+    if ids:
+        client = await connect_client(user_client("scrubber", session_string))
+        try:
+            for n in range(0, len(ids), MESSAGES_PER_CALL):
+                with track_telegram("delete_messages"):
+                    await client.delete_messages("me", ids[n:n + MESSAGES_PER_CALL])
+        finally:
+            await disconnect_client(client)
+
+    done = [e.id for e in entries if not live.intersection(e.message_ids)]
+    if done: await PurgeEntry.find(In(PurgeEntry.id, done)).delete()
+    for entry in entries:
+        if entry.id not in done:
+            await entry.set({PurgeEntry.message_ids: [m for m in entry.message_ids if m in live]})
+    SCRUB_PURGED.inc(len(ids))
+    return len(ids)
+
+async def _drain_all() -> int:
+    purged = 0
+    for phone in await PurgeEntry.get_pymongo_collection().distinct("owner_phone"):
+        owner = await User.find_one(User.phone_number == phone)
+        if not owner:
+            # The account (and its session) is gone, so its Saved Messages are out of reach.
+            await PurgeEntry.find(PurgeEntry.owner_phone == phone).delete()
+            continue
+        try: purged += await drain_purges(phone, owner.session_string)
+        except Exception as e: logger.warning(f"Purge for {phone} failed, will retry next pass: {e}")
+        await _yield_to_users()
+    return purged
+
+
+# --- TEMP FILES ---
+def clean_temp_files(max_age: int) -> int:
+    root = tempfile.gettempdir()
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(root):
+        if not name.startswith((UPLOAD_PREFIX, ZIP_PREFIX)): continue
+        path = os.path.join(root, name)
+        try:
+            if os.path.getmtime(path) > cutoff: continue
+            if os.path.isdir(path): shutil.rmtree(path)
+            else: os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+# --- PASSES ---
+async def _scrub_batch(items: List[FileSystemItem], stats: Dict[str, int]):
+    phones = list({i.owner_phone for i in items})
+    owners = {u.phone_number: u for u in await User.find(In(User.phone_number, phones)).to_list()}
+    folders = await _live_folders(items)
+    orphans = [i for i in items if i.owner_phone not in owners or (i.parent_id and i.parent_id not in folders)]
+    reaped = set()
+    if orphans:
+        SCRUB_ITEMS.labels("orphan").inc(len(orphans))
+        reaped = await reap_subtrees(orphans)
+        stats["reaped"] += len(reaped)
+
+    by_owner: Dict[str, List[FileSystemItem]] = {}
+    for item in items:
+        if item.id not in reaped and not item.is_folder and item.parts:
+            by_owner.setdefault(item.owner_phone, []).append(item)
+    for phone, owned in by_owner.items():
+        try:
+            client = await connect_client(user_client("scrubber", owners[phone].session_string))
+            try:
+                counts = await verify_parts(client, owned)
+            finally:
+                await disconnect_client(client)
+        except Exception as e:
+            logger.warning(f"Scrubbing files of {phone} failed: {e}")
+            continue
+        for key, value in counts.items(): stats[key] += value
+
+async def scrub_pass() -> Dict[str, int]:
+    """One full walk over the filesystem collection; passes never overlap."""
+    async with _pass_lock:
+        started = time.perf_counter()
+        stats = {"ok": 0, "missing": 0, "drift": 0, "reaped": 0, "purged": 0, "temp_files": 0}
+        stats["temp_files"] = await run_blocking(clean_temp_files, settings.SCRUB_TEMP_MAX_AGE)
+        await run_blocking(hls.evict)  # also clears builds cut short by a restart
+        last_id = None
+        while True:
+            query = FileSystemItem.find(FileSystemItem.id > last_id) if last_id else FileSystemItem.find_all()
+            items = await query.sort(+FileSystemItem.id).limit(settings.SCRUB_BATCH_SIZE).to_list()
+            if not items: break
+            last_id = items[-1].id
+            await _yield_to_users()
+            await _scrub_batch(items, stats)
+        stats["purged"] = await _drain_all()
+        SCRUB_PASS_DURATION.observe(time.perf_counter() - started)
+        logger.info(f"Scrub pass done in {time.perf_counter() - started:.1f}s: {stats}")
+        return stats
+
+async def _run_forever():
+    await asyncio.sleep(STARTUP_DELAY)
+    while True:
+        try: await scrub_pass()
+        except Exception as e: logger.error(f"Scrub pass failed: {e}")
+        await asyncio.sleep(settings.SCRUB_INTERVAL)
+
+def _spawn(coro, what: str) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    task.add_done_callback(lambda t: t.cancelled() or not t.exception() or logger.error(f"{what} failed: {t.exception()}"))
+    return task
+
+def start():
+    global _loop_task
+    if settings.SCRUB_ENABLED and not _loop_task:
+        _loop_task = asyncio.create_task(_run_forever())
+
+def stop():
+    global _loop_task
+    for task in [_loop_task, *_tasks]:
+        if task: task.cancel()
+    _loop_task = None
+
+def start_pass() -> bool:
+    """Runs a pass now (admin trigger); False if one is already running."""
+    if _pass_lock.locked(): return False
+    _spawn(scrub_pass(), "Scrub pass")
+    return True
+
+def start_purge(phone: str, session_string: str):
+    """Purges an owner's queue right away with a session that is about to be deleted."""
+    _spawn(drain_purges(phone, session_string), f"Purge for {phone}")
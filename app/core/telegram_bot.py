@@ -1,6 +1,8 @@
+import asyncio
 import logging
 from pyrogram import Client
 from app.core.config import settings
+from app.core.metrics import track_telegram
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
@@ -23,12 +25,49 @@ else:
         bot_token=settings.BOT_TOKEN
     )
 
+def user_client(name: str, session_string: str) -> Client:
+    """Short-lived in-memory client acting on behalf of a logged-in user."""
+    return Client(name, api_id=settings.API_ID, api_hash=settings.API_HASH, session_string=session_string, in_memory=True)
+
+async def connect_client(client: Client) -> Client:
+    with track_telegram("connect"):
+        await client.connect()
+    return client
+
+async def disconnect_client(client: Client):
+    """disconnect() alone leaves cross-DC media sessions (see transfer.py) running."""
+    for session in list(client.media_sessions.values()):
+        try: await session.stop()
+        except Exception: pass
+    client.media_sessions.clear()
+    await client.disconnect()
+
+_bot_lock = asyncio.Lock()
+_bot_started = False
+
+def bot_started() -> bool:
+    return _bot_started
+
+async def get_bot() -> Client:
+    """Returns the shared bot/userbot client, connecting it on first use."""
+    global _bot_started
+    if _bot_started: return tg_client
+    async with _bot_lock:
+        if not _bot_started:
+            await start_telegram()
+            _bot_started = True
+    return tg_client
+
 async def start_telegram():
     logger.info("Connecting to Telegram...")
-    await tg_client.start()
-    me = await tg_client.get_me()
+    with track_telegram("start"):
+        await tg_client.start()
+    me = tg_client.me  # start() already fetched it, no extra round trip
     logger.info(f"Connected as {me.first_name} (@{me.username})")
 
 async def stop_telegram():
+    global _bot_started
+    if not _bot_started: return
     logger.info("Stopping Telegram Client...")
-    await tg_client.stop()
\ No newline at end of file
+    await tg_client.stop()
+    _bot_started = False
\ No newline at end of file
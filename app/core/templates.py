@@ -0,0 +1,13 @@
+from fastapi.templating import Jinja2Templates
+
+# One shared environment for every router instead of a Jinja2Templates per module.
+templates = Jinja2Templates(directory="app/templates")
+# Templates ship with the image, so skip the per-render mtime check.
+templates.env.auto_reload = False
+
+def precompile_templates() -> int:
+    """Compiles every template into the environment cache so the first request doesn't pay for it."""
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
@@ -0,0 +1,257 @@
+"""
+Telegram download layer.
+
+Instead of pyrogram's fixed 1 MiB stream_media/download_media, transfers are
+planned per workload and executed with raw upload.GetFile requests:
+
+  seek        small range probes (e.g. MP4 moov lookups): one request sized to the range
+  sequential  playback: small first request for fast first byte, then ramp to 1 MiB with prefetch
+  bulk        zip / tree export: 1 MiB requests with several in flight
+
+GetFile rules: offset and limit are multiples of 4 KiB, 1 MiB is divisible by
+limit, and a request never crosses a 1 MiB boundary. Aligning every request
+to its own size satisfies all of them.
+"""
+import re
+import time
+import asyncio
+import logging
+import secrets
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+import aiofiles
+from pyrogram import Client, raw
+from pyrogram.file_id import FileId, FileType
+from pyrogram.session import Auth, Session
+
+from app.core.config import settings
+from app.core.metrics import track_transfer, TRANSFER_REQUESTS, TRANSFER_LATENCY, TRANSFER_WASTE, TRANSFER_FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+SEEK, SEQUENTIAL, BULK = "seek", "sequential", "bulk"
+
+KB = 1024
+MB = 1024 * 1024
+MIN_REQUEST = 4 * KB
+MAX_REQUEST = 1 * MB
+
+
+@dataclass
+class TransferPlan:
+    workload: str
+    start: int        # first byte wanted (inclusive)
+    end: int          # last byte wanted (inclusive)
+    first_request: int
+    max_request: int
+    parallel: int
+
+    def requests(self):
+        """Yields (offset, limit) pairs covering [start, end], each aligned to its own size."""
+        pos = self.start - self.start % self.first_request
+        target = self.first_request
+        while pos <= self.end:
+            size = target
+            while pos % size: size //= 2
+            yield pos, size
+            pos += size
+            target = min(target * 2, self.max_request)
+
+
+def _next_pow2(n: int) -> int:
+    return 1 << max(n - 1, 0).bit_length()
+
+def plan_transfer(workload: str, start: int, end: int) -> TransferPlan:
+    span = end - start + 1
+    if workload == SEEK:
+        size = min(max(_next_pow2(span), MIN_REQUEST), MAX_REQUEST)
+        # Grow until one aligned request covers the whole probe.
+        while size < MAX_REQUEST and start // size != end // size: size *= 2
+        plan = TransferPlan(workload, start, end, size, size, 2)
+    elif workload == BULK:
+        plan = TransferPlan(workload, start, end, MAX_REQUEST, MAX_REQUEST, settings.TRANSFER_BULK_PARALLEL)
+    else:
+        plan = TransferPlan(workload, start, end, settings.TRANSFER_FIRST_REQUEST, MAX_REQUEST, settings.TRANSFER_PREFETCH)
+    logger.debug(f"Transfer plan: {plan}")
+    return plan
+
+def workload_for_range(start: int, end: int, explicit_end: bool) -> str:
+    """Browsers probe with bounded ranges; open-ended ranges mean playback."""
+    if explicit_end and end - start + 1 <= MAX_REQUEST: return SEEK
+    return SEQUENTIAL
+
+
+# --- MEDIA HELPERS ---
+def get_media(msg):
+    if not msg or getattr(msg, "empty", False): return None
+    return msg.document or msg.video or msg.audio or msg.photo
+
+def _location(file_id: FileId):
+    if file_id.file_type == FileType.PHOTO:
+        return raw.types.InputPhotoFileLocation(
+            id=file_id.media_id, access_hash=file_id.access_hash,
+            file_reference=file_id.file_reference, thumb_size=file_id.thumbnail_size
+        )
+    return raw.types.InputDocumentFileLocation(
+        id=file_id.media_id, access_hash=file_id.access_hash,
+        file_reference=file_id.file_reference, thumb_size=file_id.thumbnail_size
+    )
+
+class _CdnRedirect(Exception):
+    pass
+
+async def _invoker(client: Client, dc_id: int):
+    """
+    Same-DC files go over the client's own connection (our clients are per-request,
+    so nothing else is using it). Other DCs need an authorised media session,
+    cached on the client and closed by telegram_bot.disconnect_client / Client.stop.
+    """
+    if dc_id == await client.storage.dc_id():
+        return client.invoke
+    async with client.media_sessions_lock:
+        session = client.media_sessions.get(dc_id)
+        if not session:
+            test_mode = await client.storage.test_mode()
+            session = Session(client, dc_id, await Auth(client, dc_id, test_mode).create(), test_mode, is_media=True)
+            await session.start()
+            exported = await client.invoke(raw.functions.auth.ExportAuthorization(dc_id=dc_id))
+            await session.invoke(raw.functions.auth.ImportAuthorization(id=exported.id, bytes=exported.bytes))
+            client.media_sessions[dc_id] = session
+    return session.invoke
+
+async def _fetch(invoke, location, workload: str, offset: int, limit: int) -> bytes:
+    start = time.perf_counter()
+    r = await invoke(raw.functions.upload.GetFile(location=location, offset=offset, limit=limit), sleep_threshold=30)
+    TRANSFER_LATENCY.labels(workload).observe(time.perf_counter() - start)
+    TRANSFER_REQUESTS.labels(workload, str(limit)).inc()
+    if isinstance(r, raw.types.upload.FileCdnRedirect): raise _CdnRedirect()
+    return r.bytes
+
+
+# --- PUBLIC API ---
+async def iter_range(client: Client, media, start: int, end: int, workload: str = SEQUENTIAL) -> AsyncIterator[bytes]:
+    """Yields exactly bytes [start, end] of a message's media."""
+    with track_transfer():
+        plan = plan_transfer(workload, start, end)
+        requests = plan.requests()
+        first_offset, first_limit = next(requests)
+        try:
+            file_id = FileId.decode(media.file_id)
+            location = _location(file_id)
+            invoke = await _invoker(client, file_id.dc_id)
+            first = await _fetch(invoke, location, workload, first_offset, first_limit)
+        except _CdnRedirect:
+            TRANSFER_FALLBACKS.labels(workload, "cdn").inc()
+            async for chunk in _fallback_range(client, media, start, end):
+                yield chunk
+            return
+
+        # Up to plan.parallel requests are outstanding (in flight or waiting to be
+        # consumed), so prefetch never buffers more than that many chunks.
+        window = asyncio.Semaphore(plan.parallel)
+        pending: asyncio.Queue = asyncio.Queue()
+
+        async def producer():
+            for offset, limit in requests:
+                await window.acquire()
+                await pending.put((offset, limit, asyncio.create_task(_fetch(invoke, location, workload, offset, limit))))
+            await pending.put(None)
+
+        feeder = asyncio.create_task(producer())
+        try:
+            pos, limit, chunk = first_offset, first_limit, first
+            while True:
+                lo = max(start - pos, 0)
+                hi = min(end - pos + 1, len(chunk))
+                TRANSFER_WASTE.labels(workload).inc(len(chunk) - max(hi - lo, 0))
+                if hi > lo:
+                    yield chunk if (lo == 0 and hi == len(chunk)) else chunk[lo:hi]
+                # A short read means Telegram hit the end of the file.
+                if pos + len(chunk) > end or len(chunk) < limit: break
+                item = await pending.get()
+                if item is None: break
+                pos, limit, task = item
+                try: chunk = await task
+                finally: window.release()
+        finally:
+            feeder.cancel()
+            while not pending.empty():
+                item = pending.get_nowait()
+                if item: item[2].cancel()
+
+async def _fallback_range(client: Client, media, start: int, end: int) -> AsyncIterator[bytes]:
+    # pyrogram's stream_media counts offset/limit in 1 MiB chunks.
+    pos = (start // MB) * MB
+    async for chunk in client.stream_media(media.file_id, offset=start // MB):
+        lo = max(start - pos, 0)
+        hi = min(end - pos + 1, len(chunk))
+        if hi > lo: yield chunk[lo:hi]
+        pos += len(chunk)
+        if pos > end: break
+
+async def download_to_file(client: Client, media, path: str, workload: str = BULK) -> int:
+    """Downloads a whole media file to disk; returns bytes written."""
+    written = 0
+    async with aiofiles.open(path, "wb") as f:
+        if not media.file_size: return 0
+        async for chunk in iter_range(client, media, 0, media.file_size - 1, workload):
+            await f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+# --- LOOPBACK RANGE SERVER ---
+RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+
+@asynccontextmanager
+async def serve_local(client: Client, media):
+    """
+    Exposes a media file as a seekable http://127.0.0.1 URL for tools like ffmpeg,
+    so they can start working on the first bytes (and seek to a trailing moov)
+    instead of waiting for a full download. Every Range request maps to iter_range.
+    """
+    path = "/" + secrets.token_urlsafe(16)
+    size = media.file_size
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        chunks = None
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if len(request_line) < 2 or request_line[1] != path:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                return
+            match = RANGE_RE.match(headers.get("range", ""))
+            start = int(match.group(1)) if match else 0
+            end = min(int(match.group(2)), size - 1) if match and match.group(2) else size - 1
+            if start > end:
+                writer.write(f"HTTP/1.1 416 Range Not Satisfiable\r\nContent-Range: bytes */{size}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+                return
+            status = "206 Partial Content" if match else "200 OK"
+            writer.write((
+                f"HTTP/1.1 {status}\r\nContent-Type: application/octet-stream\r\nAccept-Ranges: bytes\r\n"
+                f"Content-Length: {end - start + 1}\r\nContent-Range: bytes {start}-{end}/{size}\r\nConnection: close\r\n\r\n"
+            ).encode())
+            if request_line[0] == "HEAD": return
+            chunks = iter_range(client, media, start, end, SEQUENTIAL)
+            async for chunk in chunks:
+                writer.write(chunk)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # the reader seeked elsewhere or finished early
+        finally:
+            if chunks: await chunks.aclose()
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}{path}"
+    finally:
+        server.close()
+        await server.wait_closed()
@@ -1,9 +1,17 @@
-from typing import Optional, List
-from beanie import Document, init_beanie
+import logging
+from typing import Optional, List, Tuple
+from beanie import Document, PydanticObjectId, init_beanie
+from beanie.operators import In
+from bson import ObjectId
 from pydantic import BaseModel, Field, ConfigDict
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, UpdateMany, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 from app.core.config import settings
+from app.core.metrics import MongoCommandListener
+
+logger = logging.getLogger(__name__)
 
 class User(Document):
     phone_number: str = Field(unique=True)
@@ -20,10 +28,24 @@ class FilePart(BaseModel):
     part_number: int
     size: int
 
+class MediaIndex(BaseModel):
+    container: str  # "mp4", "mkv" or "none" when the file could not be indexed
+    faststart: bool = True
+    header_offset: int = 0  # moov atom (MP4) or everything before the first cluster (MKV)
+    header_size: int = 0
+    duration: float = 0
+    keyframe_count: int = 0  # the table itself lives in KeyframeTable, so listings stay slim
+
+class IntegrityReport(BaseModel):
+    checked_at: datetime
+    missing_messages: List[int] = []  # FilePart.message_ids no longer on Telegram
+    size_drift: int = 0               # bytes on Telegram minus the recorded size
+
 class FileSystemItem(Document):
     name: str
     is_folder: bool
     parent_id: Optional[str] = None
+    ancestors: List[str] = []  # folder ids from the root down to parent_id
     owner_phone: str 
     created_at: datetime = datetime.now()
     
@@ -33,6 +55,8 @@ class FileSystemItem(Document):
     size: int = 0
     mime_type: Optional[str] = None
     parts: List[FilePart] = [] 
+    media_index: Optional[MediaIndex] = None
+    integrity: Optional[IntegrityReport] = None  # set by the scrubber when something is off
     
     model_config = ConfigDict(extra='allow')
     class Settings:
@@ -47,6 +71,127 @@ class SharedCollection(Document):
     class Settings:
         name = "shared_collections"
 
+class KeyframeTable(Document):
+    """(seconds, byte offset) pairs of one video; id is the FileSystemItem id."""
+    keyframes: List[Tuple[float, int]]
+    class Settings:
+        name = "media_keyframes"
+
+async def delete_keyframes(items: List["FileSystemItem"]):
+    ids = [i.id for i in items if not i.is_folder]
+    if ids: await KeyframeTable.find(In(KeyframeTable.id, ids)).delete()
+
+class PurgeEntry(Document):
+    """Telegram messages of deleted items, removed later by the scrubber with the owner's session."""
+    owner_phone: str
+    message_ids: List[int]
+    created_at: datetime = Field(default_factory=datetime.now)
+    class Settings:
+        name = "purge_queue"
+
+async def queue_purge(items: List["FileSystemItem"]):
+    by_owner = {}
+    for item in items:
+        by_owner.setdefault(item.owner_phone, []).extend(p.message_id for p in item.parts)
+    entries = [PurgeEntry(owner_phone=phone, message_ids=ids) for phone, ids in by_owner.items() if ids]
+    if entries: await PurgeEntry.insert_many(entries)
+
+class AccessGrant(Document):
+    """user_phone may open folder_id and everything below it (see app/core/access.py)."""
+    user_phone: str
+    folder_id: str
+    owner_phone: str
+    role: str = "collaborator"  # "owner" grants keep folder owners in control of what collaborators add
+    created_at: datetime = Field(default_factory=datetime.now)
+    class Settings:
+        name = "access_grants"
+        indexes = [IndexModel([("user_phone", 1), ("folder_id", 1)], unique=True)]
+
+def grant_op(folder_id: str, owner_phone: str, phone: str, role: str = "collaborator") -> UpdateOne:
+    return UpdateOne(
+        {"user_phone": phone, "folder_id": folder_id},
+        {"$set": {"role": role, "owner_phone": owner_phone}, "$setOnInsert": {"created_at": datetime.now()}},
+        upsert=True
+    )
+
+def to_object_ids(ids: List[str]) -> List[PydanticObjectId]:
+    """Item ids arrive from the browser as strings; Mongo only matches them as ObjectIds."""
+    return [PydanticObjectId(i) for i in ids if ObjectId.is_valid(i)]
+
+# A folder name is unique within its parent, so concurrent uploads can upsert folders safely.
+FOLDER_KEY = [("owner_phone", 1), ("parent_id", 1), ("name", 1)]
+
+async def merge_duplicate_folders() -> int:
+    """Folds folders created twice by the old racy upload path into the oldest copy."""
+    collection = FileSystemItem.get_pymongo_collection()
+    merged = 0
+    while True:
+        groups = await collection.aggregate([
+            {"$match": {"is_folder": True}},
+            {"$group": {"_id": {"o": "$owner_phone", "p": "$parent_id", "n": "$name"}, "ids": {"$push": "$_id"}, "collaborators": {"$push": "$collaborators"}}},
+            {"$match": {"ids.1": {"$exists": True}}},
+        ]).to_list(None)
+        if not groups: return merged
+        for group in groups:
+            keep, *dups = sorted(group["ids"])
+            collaborators = sorted({c for lst in group["collaborators"] if lst for c in lst})
+            await collection.update_many({"parent_id": {"$in": [str(d) for d in dups]}}, {"$set": {"parent_id": str(keep)}})
+            for dup in dups:
+                await collection.update_many({"ancestors": str(dup)}, {"$set": {"ancestors.$": str(keep)}})
+            if collaborators: await collection.update_one({"_id": keep}, {"$addToSet": {"collaborators": {"$each": collaborators}}})
+            await collection.delete_many({"_id": {"$in": dups}})
+            merged += len(dups)
+
+async def ensure_folder_index():
+    collection = FileSystemItem.get_pymongo_collection()
+    options = dict(unique=True, partialFilterExpression={"is_folder": True}, name="unique_folder_path")
+    try:
+        await collection.create_index(FOLDER_KEY, **options)
+    except DuplicateKeyError:
+        logger.info(f"Merged {await merge_duplicate_folders()} duplicate folders")
+        await collection.create_index(FOLDER_KEY, **options)
+
+async def backfill_access():
+    """Computes ancestors for every item (breadth-first from the roots) and grants for existing collaborators."""
+    collection = FileSystemItem.get_pymongo_collection()
+    await collection.update_many({"parent_id": None}, {"$set": {"ancestors": []}})
+    level = await collection.find({"parent_id": None, "is_folder": True}, {"_id": 1}).to_list(None)
+    chains = {str(doc["_id"]): [] for doc in level}
+    while chains:
+        ops = [UpdateMany({"parent_id": fid}, {"$set": {"ancestors": chain + [fid]}}) for fid, chain in chains.items()]
+        for n in range(0, len(ops), 1000): await collection.bulk_write(ops[n:n + 1000], ordered=False)
+        children = await collection.find({"parent_id": {"$in": list(chains)}, "is_folder": True}, {"_id": 1, "ancestors": 1}).to_list(None)
+        chains = {str(doc["_id"]): doc["ancestors"] for doc in children}
+
+    ops = []
+    async for folder in collection.find({"is_folder": True, "collaborators.0": {"$exists": True}}, {"owner_phone": 1, "collaborators": 1}):
+        fid = str(folder["_id"])
+        ops.append(grant_op(fid, folder["owner_phone"], folder["owner_phone"], "owner"))
+        ops.extend(grant_op(fid, folder["owner_phone"], phone) for phone in folder["collaborators"])
+    for n in range(0, len(ops), 1000): await AccessGrant.get_pymongo_collection().bulk_write(ops[n:n + 1000], ordered=False)
+
+async def ensure_access_index():
+    collection = FileSystemItem.get_pymongo_collection()
+    await collection.create_index("ancestors")
+    if await collection.find_one({"ancestors": {"$exists": False}}, {"_id": 1}):
+        await backfill_access()
+        logger.info("Backfilled folder ancestors and access grants")
+
+async def move_inline_keyframes():
+    """Moves keyframe tables that older versions stored inside FileSystemItem.media_index."""
+    collection = FileSystemItem.get_pymongo_collection()
+    query = {"media_index.keyframes": {"$exists": True}}
+    while docs := await collection.find(query, {"media_index.keyframes": 1}).limit(200).to_list(None):
+        tables = [UpdateOne({"_id": d["_id"]}, {"$set": {"keyframes": d["media_index"]["keyframes"]}}, upsert=True) for d in docs if d["media_index"]["keyframes"]]
+        if tables: await KeyframeTable.get_pymongo_collection().bulk_write(tables, ordered=False)
+        await collection.bulk_write([
+            UpdateOne({"_id": d["_id"]}, {"$set": {"media_index.keyframe_count": len(d["media_index"]["keyframes"])}, "$unset": {"media_index.keyframes": ""}})
+            for d in docs
+        ], ordered=False)
+
 async def init_db():
-    client = AsyncIOMotorClient(settings.MONGO_URI)
-    await init_beanie(database=client.morgan_db, document_models=[User, FileSystemItem, SharedCollection])
\ No newline at end of file
+    client = AsyncIOMotorClient(settings.MONGO_URI, event_listeners=[MongoCommandListener()])
+    await init_beanie(database=client.morgan_db, document_models=[User, FileSystemItem, SharedCollection, PurgeEntry, AccessGrant, KeyframeTable])
+    await ensure_folder_index()
+    await ensure_access_index()
+    await move_inline_keyframes()
\ No newline at end of file
@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Request, HTTPException, Form
-from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
-from app.db.models import User, FileSystemItem
+from fastapi.responses import RedirectResponse, JSONResponse
+from app.db.models import User, FileSystemItem, queue_purge, delete_keyframes
 from app.routes.dashboard import get_current_user
 from app.core.config import settings
+from app.core.templates import templates
+from app.core import indexer, scrubber
+from app.core.listing_cache import listing_cache
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/admin")
 async def admin_panel(request: Request):
@@ -38,8 +39,32 @@ async def delete_user(request: Request, user_phone: str = Form(...)):
     
     target = await User.find_one(User.phone_number == user_phone)
     if target:
-        await target.delete()
-        # Optional: Delete their files too
+        # Drop their items first: the purge skips messages that live items still point at.
+        files = await FileSystemItem.find(FileSystemItem.owner_phone == user_phone, FileSystemItem.is_folder == False).to_list()
+        await queue_purge(files)
         await FileSystemItem.find(FileSystemItem.owner_phone == user_phone).delete()
+        await delete_keyframes(files)
+        # The session is handed over in memory, so the purge still works once the user is gone.
+        scrubber.start_purge(user_phone, target.session_string)
+        await target.delete()
+        listing_cache.clear()  # their items can sit in any folder or collaborator root
     
-    return RedirectResponse("/admin", status_code=303)
\ No newline at end of file
+    return RedirectResponse("/admin", status_code=303)
+
+@router.post("/admin/media_index/backfill")
+async def backfill_media_index(request: Request):
+    """Indexes MP4/MKV containers of videos uploaded before indexing existed."""
+    user = await get_current_user(request)
+    if not user or user.phone_number.replace(" ", "") != getattr(settings, "ADMIN_PHONE", "").replace(" ", ""):
+        raise HTTPException(403)
+    started = indexer.start_backfill()
+    return JSONResponse({"status": "started" if started else "already running"})
+
+@router.post("/admin/scrub")
+async def run_scrubber(request: Request):
+    """Starts an integrity pass now instead of waiting for the next scheduled one."""
+    user = await get_current_user(request)
+    if not user or user.phone_number.replace(" ", "") != getattr(settings, "ADMIN_PHONE", "").replace(" ", ""):
+        raise HTTPException(403)
+    started = scrubber.start_pass()
+    return JSONResponse({"status": "started" if started else "already running"})
@@ -1,13 +1,12 @@
 import traceback
 from fastapi import APIRouter, Request, Form, Response
-from fastapi.templating import Jinja2Templates
 from fastapi.responses import JSONResponse, RedirectResponse
 from pyrogram import Client, errors
 from app.core.config import settings
 from app.db.models import User
+from app.core.templates import templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 # In-memory storage for temporary login steps (Production apps should use Redis)
 temp_auth_data = {} 
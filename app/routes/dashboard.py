@@ -6,22 +6,36 @@ import mimetypes
 import uuid
 import zipfile
 import asyncio
-from typing import Optional, Dict, List
+import time
+from datetime import datetime
+from typing import Optional, Dict, List, Iterable
 
-from fastapi import APIRouter, Request, UploadFile, File, Form, BackgroundTasks, Body
-from fastapi.templating import Jinja2Templates
+import aiofiles
+
+from fastapi import APIRouter, Request, UploadFile, File, Form, BackgroundTasks, Body, HTTPException
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from fastapi.responses import RedirectResponse, JSONResponse, FileResponse
-from pyrogram import Client
-from beanie.operators import Or, In
-from app.db.models import FileSystemItem, FilePart, User, SharedCollection
-from app.core.config import settings
+from beanie.operators import Or, And, In
+from bson import ObjectId
+from app.db.models import FileSystemItem, FilePart, User, SharedCollection, to_object_ids, queue_purge, delete_keyframes
+from app.core.telegram_bot import user_client, connect_client, disconnect_client
+from app.core.transfer import download_to_file, get_media, BULK
+from app.core.indexer import is_indexable, index_local_file, to_media_index, save_keyframes
+from app.core.scrubber import UPLOAD_PREFIX, ZIP_PREFIX
+from app.core.listing_cache import listing_cache, listing_key, root_key, invalidate_items
+from app.core.blocking import run_blocking
+from app.core import access
+from app.core.metrics import track_telegram, UPLOAD_BYTES, UPLOAD_DURATION, UPLOADS_ACTIVE, ZIP_BYTES, ZIP_DURATION, ZIPS_ACTIVE
 from app.utils.file_utils import format_size, get_icon_for_mime
+from app.core.templates import templates
 from starlette.background import BackgroundTask
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 mimetypes.init()
 
+UPLOAD_COPY_CHUNK = 1024 * 1024
+
 # --- IN-MEMORY JOB TRACKER ---
 upload_jobs: Dict[str, dict] = {}
 
@@ -30,28 +44,87 @@ async def get_current_user(request: Request):
     if not phone: return None
     return await User.find_one(User.phone_number == phone)
 
-# --- HELPER 1: Recursively Create Folder Structure (Uploads) ---
+# --- HELPER 1: Create Folder Structure (Uploads) ---
+def _new_folder_fields(user_phone: str, ancestors: List[str]) -> dict:
+    return {"owner_phone": user_phone, "is_folder": True, "created_at": datetime.now(), "ancestors": ancestors, "collaborators": [], "size": 0, "parts": []}
+
+async def get_or_create_folder(user_phone: str, parent_id: Optional[str], name: str) -> str:
+    """Race-safe single folder upsert (backed by the unique_folder_path index)."""
+    collection = FileSystemItem.get_pymongo_collection()
+    key = {"owner_phone": user_phone, "parent_id": parent_id, "name": name, "is_folder": True}
+    try:
+        fields = _new_folder_fields(user_phone, await access.ancestors_for(parent_id))
+        doc = await collection.find_one_and_update(key, {"$setOnInsert": fields}, upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        doc = await collection.find_one(key)  # lost the race, the other request created it
+    listing_cache.invalidate(listing_key(parent_id, user_phone))
+    return str(doc["_id"])
+
+async def create_folder_tree(user_phone: str, root_parent_id: Optional[str], folder_paths: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Creates every folder in folder_paths (e.g. "a/b/c" also creates "a" and "a/b") under
+    root_parent_id. Costs one bulk upsert and one read per depth level, no matter how
+    many files or folders there are. Returns {path: folder_id}, with "" mapping to the root.
+    """
+    ids: Dict[str, Optional[str]] = {"": root_parent_id}
+    chains: Dict[str, List[str]] = {"": await access.ancestors_for(root_parent_id)}  # ancestors of each path's children
+    wanted = set()
+    for path in folder_paths:
+        parts = [p for p in path.split("/") if p]
+        for i in range(1, len(parts) + 1): wanted.add("/".join(parts[:i]))
+
+    by_depth: Dict[int, List[str]] = {}
+    for path in wanted: by_depth.setdefault(path.count("/"), []).append(path)
+
+    collection = FileSystemItem.get_pymongo_collection()
+    for depth in sorted(by_depth):
+        keys = {}
+        for path in by_depth[depth]:
+            parent_path, _, name = path.rpartition("/")
+            keys[(ids[parent_path], name)] = path
+
+        ops = [
+            UpdateOne({"owner_phone": user_phone, "parent_id": parent, "name": name, "is_folder": True},
+                      {"$setOnInsert": _new_folder_fields(user_phone, chains[path.rpartition("/")[0]])}, upsert=True)
+            for (parent, name), path in keys.items()
+        ]
+        try:
+            upserted = (await collection.bulk_write(ops, ordered=False)).upserted_ids
+        except BulkWriteError as e:
+            # Duplicate keys mean a parallel upload created the folder first; anything else is real.
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])): raise
+            upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+        parents = list(keys)
+        listing_cache.invalidate(*{listing_key(parents[i][0], user_phone) for i in upserted})
+
+        docs = await collection.find(
+            {"owner_phone": user_phone, "is_folder": True,
+             "parent_id": {"$in": list({parent for parent, _ in keys})}, "name": {"$in": list({name for _, name in keys})}},
+            {"_id": 1, "parent_id": 1, "name": 1}
+        ).to_list(None)
+        for doc in docs:
+            path = keys.get((doc.get("parent_id"), doc["name"]))
+            if path: ids[path] = str(doc["_id"])
+        for path in keys.values():
+            if path in ids: chains[path] = chains[path.rpartition("/")[0]] + [ids[path]]
+    return ids
+
 async def get_or_create_folder_path(user_phone: str, start_parent_id: Optional[str], path_parts: list) -> Optional[str]:
-    current_parent_id = start_parent_id
-    for folder_name in path_parts:
-        existing = await FileSystemItem.find_one(
-            FileSystemItem.owner_phone == user_phone,
-            FileSystemItem.parent_id == current_parent_id,
-            FileSystemItem.name == folder_name,
-            FileSystemItem.is_folder == True
-        )
-        if existing:
-            current_parent_id = str(existing.id)
-        else:
-            new_folder = FileSystemItem(name=folder_name, is_folder=True, parent_id=current_parent_id, owner_phone=user_phone)
-            await new_folder.insert()
-            current_parent_id = str(new_folder.id)
-    return current_parent_id
+    if not path_parts: return start_parent_id
+    path = "/".join(path_parts)
+    return (await create_folder_tree(user_phone, start_parent_id, [path]))[path]
+
+async def can_write_into(user: User, parent_id: Optional[str]) -> bool:
+    """Creating items under parent_id needs access to it; new items inherit its ancestors and grants."""
+    if not parent_id: return True
+    parent = await FileSystemItem.get(parent_id) if ObjectId.is_valid(parent_id) else None
+    return bool(parent and parent.is_folder and await access.has_access(user.phone_number, parent))
 
 # --- HELPER 2: Recursive Download for Zip (Downloads) ---
-async def download_item_recursive(client, item, base_path):
+async def download_item_recursive(get_client, item, base_path):
     """
     Downloads a file OR recursively downloads a folder contents to the base_path.
+    get_client(owner_phone) returns a connected client for the file's owner.
     """
     try:
         if item.is_folder:
@@ -64,22 +137,19 @@ async def download_item_recursive(client, item, base_path):
             
             # 3. Recurse for each child
             for child in children:
-                await download_item_recursive(client, child, new_folder_path)
+                await download_item_recursive(get_client, child, new_folder_path)
         else:
             # It's a file, download it
             # Refresh file ref by getting message again
             try:
-                msg = await client.get_messages("me", message_ids=item.parts[0].message_id)
-                
-                file_id = None
-                if msg.document: file_id = msg.document.file_id
-                elif msg.video: file_id = msg.video.file_id
-                elif msg.audio: file_id = msg.audio.file_id
-                elif msg.photo: file_id = msg.photo.file_id
-                
-                if file_id:
+                client = await get_client(item.owner_phone)
+                with track_telegram("get_messages"):
+                    msg = await client.get_messages("me", message_ids=item.parts[0].message_id)
+
+                media = get_media(msg)
+                if media:
                     # Save to: base_path/filename
-                    await client.download_media(file_id, file_name=os.path.join(base_path, item.name))
+                    await download_to_file(client, media, os.path.join(base_path, item.name), BULK)
             except Exception as inner_e:
                 print(f"Failed to refresh/download {item.name}: {inner_e}")
                 
@@ -88,21 +158,33 @@ async def download_item_recursive(client, item, base_path):
 
 # --- BACKGROUND UPLOAD TASK ---
 async def process_telegram_upload(job_id: str, file_path: str, filename: str, mime_type: str, parent_id: Optional[str], user_phone: str, session_string: str):
+    started = time.perf_counter()
+    outcome = "failed"
+    UPLOADS_ACTIVE.inc()
     try:
         upload_jobs[job_id]["status"] = "uploading"
-        async with Client("uploader", api_id=settings.API_ID, api_hash=settings.API_HASH, session_string=session_string, in_memory=True) as app:
+        async with user_client("uploader", session_string) as app:
             async def progress(current, total):
                 percent = (current / total) * 100
                 upload_jobs[job_id]["progress"] = round(percent, 2)
 
-            msg = await app.send_document(
-                chat_id="me", 
-                document=file_path,
-                file_name=filename,
-                caption="Uploaded via MorganXMystic",
-                force_document=True,
-                progress=progress
-            )
+            # Index the container from the local temp file while it uploads.
+            indexing = asyncio.create_task(index_local_file(file_path)) if is_indexable(mime_type, filename) else None
+            try:
+                with track_telegram("send_document"):
+                    msg = await app.send_document(
+                        chat_id="me", 
+                        document=file_path,
+                        file_name=filename,
+                        caption="Uploaded via MorganXMystic",
+                        force_document=True,
+                        progress=progress
+                    )
+            except BaseException:
+                if indexing: indexing.cancel()
+                raise
+            UPLOAD_BYTES.inc(msg.document.file_size)
+            index = await indexing if indexing else None
             
             new_file = FileSystemItem(
                 name=filename,
@@ -111,16 +193,23 @@ async def process_telegram_upload(job_id: str, file_path: str, filename: str, mi
                 owner_phone=user_phone,
                 size=msg.document.file_size,
                 mime_type=mime_type,
-                parts=[FilePart(telegram_file_id=msg.document.file_id, message_id=msg.id, part_number=1, size=msg.document.file_size)]
+                ancestors=await access.ancestors_for(parent_id),
+                parts=[FilePart(telegram_file_id=msg.document.file_id, message_id=msg.id, part_number=1, size=msg.document.file_size)],
+                media_index=to_media_index(index) if indexing else None
             )
             await new_file.insert()
+            await save_keyframes(new_file.id, index)
+            invalidate_items([new_file])
             upload_jobs[job_id]["status"] = "completed"
             upload_jobs[job_id]["progress"] = 100
+            outcome = "completed"
     except Exception as e:
         print(f"Upload Failed: {e}")
         upload_jobs[job_id]["status"] = "failed"
         upload_jobs[job_id]["error"] = str(e)
     finally:
+        UPLOADS_ACTIVE.dec()
+        UPLOAD_DURATION.labels(outcome).observe(time.perf_counter() - started)
         if os.path.exists(file_path):
             try: os.remove(file_path)
             except: pass
@@ -135,26 +224,29 @@ async def dashboard(request: Request, folder_id: Optional[str] = None):
     if not user: return RedirectResponse("/login")
     if folder_id == "None" or folder_id == "": folder_id = None
 
-    if folder_id:
-        items = await FileSystemItem.find(FileSystemItem.parent_id == folder_id).to_list()
-    else:
-        items = await FileSystemItem.find(
-            Or(FileSystemItem.owner_phone == user.phone_number, FileSystemItem.collaborators == user.phone_number),
-            FileSystemItem.parent_id == None
-        ).to_list()
-
-    current_folder = await FileSystemItem.get(folder_id) if folder_id else None
-    visible_items = []
-    
-    for item in items:
-        if item.owner_phone == user.phone_number or user.phone_number in item.collaborators or folder_id:
-            item.formatted_size = format_size(item.size)
-            item.icon = "fa-folder" if item.is_folder else get_icon_for_mime(item.mime_type)
-            if not item.share_token: item.share_token = ""
-            visible_items.append(item)
+    key = listing_key(folder_id, user.phone_number)
+    listing = listing_cache.get(key)
+    if listing is None:
+        current_folder = None
+        if folder_id:
+            current_folder = await FileSystemItem.get(folder_id) if ObjectId.is_valid(folder_id) else None
+            if not current_folder or not current_folder.is_folder: return RedirectResponse("/dashboard")
+            if not await access.has_access(user.phone_number, current_folder): raise HTTPException(403, "No access to this folder")
+            items = await FileSystemItem.find(FileSystemItem.parent_id == folder_id).to_list()
+        else:
+            # Own roots plus every folder shared with this user, wherever it sits in the owner's tree.
+            granted = set(await access.granted_roots(user.phone_number))
+            items = await FileSystemItem.find(Or(
+                And(FileSystemItem.owner_phone == user.phone_number, FileSystemItem.parent_id == None),
+                In(FileSystemItem.id, to_object_ids(list(granted)))
+            )).to_list()
+            items = [i for i in items if not set(i.ancestors) & granted]  # a share nested in another share shows once
+        listing = listing_cache.put(key, current_folder, items)
+    elif listing.folder and not await access.has_access(user.phone_number, listing.folder):
+        raise HTTPException(403, "No access to this folder")
 
     return templates.TemplateResponse("dashboard.html", {
-        "request": request, "items": visible_items, "current_folder": current_folder, "user": user
+        "request": request, "items": listing.rows, "current_folder": listing.folder, "user": user
     })
 
 # --- UPLOAD ROUTES ---
@@ -178,6 +270,7 @@ async def upload_file(request: Request, background_tasks: BackgroundTasks, file:
         if not mime_type: mime_type = file.content_type or "application/octet-stream"
         
         final_parent_id = parent_id if parent_id and parent_id != "None" else None
+        if not await can_write_into(user, final_parent_id): return JSONResponse({"error": "No access to this folder"}, 403)
 
         # Folder Logic
         if relative_path and "/" in relative_path:
@@ -186,15 +279,34 @@ async def upload_file(request: Request, background_tasks: BackgroundTasks, file:
                 final_parent_id = await get_or_create_folder_path(user.phone_number, final_parent_id, path_parts)
 
         job_id = str(uuid.uuid4())
-        fd, tmp_path = tempfile.mkstemp()
+        fd, tmp_path = tempfile.mkstemp(prefix=UPLOAD_PREFIX)
         os.close(fd)
-        with open(tmp_path, "wb") as buffer: shutil.copyfileobj(file.file, buffer)
+        # UploadFile.read and aiofiles both hop to threads, so big uploads don't stall other requests.
+        async with aiofiles.open(tmp_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_COPY_CHUNK): await buffer.write(chunk)
 
         upload_jobs[job_id] = {"id": job_id, "filename": safe_filename, "status": "queued", "progress": 0, "owner": user.phone_number}
         background_tasks.add_task(process_telegram_upload, job_id, tmp_path, safe_filename, mime_type, final_parent_id, user.phone_number, user.session_string)
         return JSONResponse({"status": "queued", "job_id": job_id})
     except Exception as e: return JSONResponse({"error": str(e)}, 500)
 
+@router.post("/upload/manifest")
+async def upload_manifest(request: Request, paths: List[str] = Body(...), parent_id: Optional[str] = Body(None)):
+    """
+    Folder uploads send every relative file path here first. The whole directory tree is
+    created in one batch and the response maps each path to the folder id its file should
+    be uploaded into (as /upload's parent_id).
+    """
+    user = await get_current_user(request)
+    if not user: return JSONResponse({"error": "Unauthorized"}, 401)
+    root = parent_id if parent_id and parent_id != "None" else None
+    if not await can_write_into(user, root): return JSONResponse({"error": "No access to this folder"}, 403)
+    folder_of = {path: "/".join(p for p in path.split("/")[:-1] if p) for path in paths}
+    try:
+        ids = await create_folder_tree(user.phone_number, root, folder_of.values())
+    except Exception as e: return JSONResponse({"error": str(e)}, 500)
+    return JSONResponse({"status": "success", "parents": {path: ids[folder] for path, folder in folder_of.items()}})
+
 @router.get("/upload/status")
 async def get_upload_status(request: Request):
     user = await get_current_user(request)
@@ -208,35 +320,62 @@ async def download_zip(request: Request, item_ids: List[str] = Body(...)):
     user = await get_current_user(request)
     if not user: return JSONResponse({"error": "Unauthorized"}, 401)
 
-    items = await FileSystemItem.find(In(FileSystemItem.id, item_ids)).to_list()
+    items = await FileSystemItem.find(In(FileSystemItem.id, to_object_ids(item_ids))).to_list()
+    items = [item for item in items if await access.has_access(user.phone_number, item)]
     if not items: return JSONResponse({"error": "No items found"}, 404)
 
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = tempfile.mkdtemp(prefix=ZIP_PREFIX)
     zip_filename = f"MorganCloud_Bundle_{uuid.uuid4().hex[:6]}.zip"
-    zip_path = os.path.join(tempfile.gettempdir(), zip_filename)
+    zip_path = os.path.join(tempfile.gettempdir(), ZIP_PREFIX + zip_filename)
+    started = time.perf_counter()
+    ZIPS_ACTIVE.inc()
+
+    # Shared folders can hold files of several uploaders; each needs its owner's client.
+    clients = {}
+    async def get_client(phone: str):
+        if phone not in clients:
+            session = await access.owner_session(phone, user)
+            if not session: raise ValueError("Owner account no longer exists")
+            clients[phone] = await connect_client(user_client("downloader", session))
+        return clients[phone]
 
     try:
-        async with Client("downloader", api_id=settings.API_ID, api_hash=settings.API_HASH, session_string=user.session_string, in_memory=True) as app:
+        try:
             for item in items:
                 # Use recursive downloader to handle folders
-                await download_item_recursive(app, item, temp_dir)
+                await download_item_recursive(get_client, item, temp_dir)
+        finally:
+            for client in clients.values(): await disconnect_client(client)
 
-        shutil.make_archive(zip_path.replace('.zip', ''), 'zip', temp_dir)
-        shutil.rmtree(temp_dir)
+        await run_blocking(shutil.make_archive, zip_path.replace('.zip', ''), 'zip', temp_dir)
+        await run_blocking(shutil.rmtree, temp_dir)
+        ZIP_BYTES.inc(os.path.getsize(zip_path))
+        ZIP_DURATION.labels("completed").observe(time.perf_counter() - started)
 
         return FileResponse(zip_path, filename=zip_filename, background=BackgroundTask(lambda: os.remove(zip_path)))
 
     except Exception as e:
-        if os.path.exists(temp_dir): shutil.rmtree(temp_dir)
+        if os.path.exists(temp_dir): await run_blocking(shutil.rmtree, temp_dir, ignore_errors=True)
+        ZIP_DURATION.labels("failed").observe(time.perf_counter() - started)
         traceback.print_exc()
         return JSONResponse({"error": str(e)}, 500)
+    finally:
+        ZIPS_ACTIVE.dec()
 
 # --- BULK DELETE ---
 @router.post("/delete/bundle")
 async def delete_bundle(request: Request, item_ids: List[str] = Body(...)):
     user = await get_current_user(request)
     if not user: return JSONResponse({"error": "Unauthorized"}, 401)
-    await FileSystemItem.find(In(FileSystemItem.id, item_ids), FileSystemItem.owner_phone == user.phone_number).delete()
+    # Same rule as delete_item: anyone with access may delete. Descendants of
+    # deleted folders are reaped by the scrubber.
+    found = await FileSystemItem.find(In(FileSystemItem.id, to_object_ids(item_ids))).to_list()
+    items = [i for i in found if await access.has_access(user.phone_number, i)]
+    await queue_purge(items)
+    await FileSystemItem.find(In(FileSystemItem.id, [i.id for i in items])).delete()
+    await delete_keyframes(items)
+    await access.drop_grants(items)
+    invalidate_items(items, deleted=True)
     return JSONResponse({"status": "success"})
 
 # --- STANDARD ACTIONS ---
@@ -245,19 +384,39 @@ async def delete_item(request: Request, item_id: str):
     user = await get_current_user(request)
     if not user: return RedirectResponse("/login")
     item = await FileSystemItem.get(item_id)
-    if item and (item.owner_phone == user.phone_number or user.phone_number in item.collaborators):
+    if item and await access.has_access(user.phone_number, item):
+        await queue_purge([item])
         await item.delete()
+        await delete_keyframes([item])
+        await access.drop_grants([item])
+        invalidate_items([item], deleted=True)
     return RedirectResponse(f"/dashboard?folder_id={item.parent_id if item and item.parent_id else ''}", 303)
 
+@router.post("/share/bundle")
+async def create_bundle(request: Request, item_ids: List[str] = Body(...)):
+    user = await get_current_user(request)
+    if not user: return {"error": "Unauthorized"}
+    # Only items the user can reach may go public; the stream route trusts this list.
+    items = await FileSystemItem.find(In(FileSystemItem.id, to_object_ids(item_ids))).to_list()
+    item_ids = [str(i.id) for i in items if await access.has_access(user.phone_number, i)]
+    if not item_ids: return {"error": "Nothing to share"}
+    token = str(uuid.uuid4())
+    bundle = SharedCollection(token=token, item_ids=item_ids, owner_phone=user.phone_number, name=f"Shared by {user.first_name or 'User'}")
+    await bundle.insert()
+    base_url = str(request.base_url).rstrip("/")
+    return {"link": f"{base_url}/s/{token}"}
+
 @router.post("/share/{item_id}")
 async def share_item(request: Request, item_id: str):
     user = await get_current_user(request)
     if not user: return JSONResponse({"error": "Auth required"}, 401)
-    item = await FileSystemItem.get(item_id)
+    item = await FileSystemItem.get(item_id) if ObjectId.is_valid(item_id) else None
     if not item: return JSONResponse({"error": "Not found"}, 404)
+    if not await access.has_access(user.phone_number, item): return JSONResponse({"error": "Access denied"}, 403)
     if not item.share_token:
         item.share_token = str(uuid.uuid4())
         await item.save()
+        invalidate_items([item])
     base_url = str(request.base_url).rstrip("/")
     return JSONResponse({"link": f"{base_url}/s/{item.share_token}"})
 
@@ -266,7 +425,8 @@ async def create_folder(request: Request, folder_name: str = Form(...), parent_i
     user = await get_current_user(request)
     if not user: return RedirectResponse("/login")
     final_parent_id = parent_id if parent_id and parent_id != "None" else None
-    await FileSystemItem(name=folder_name, is_folder=True, parent_id=final_parent_id, owner_phone=user.phone_number).insert()
+    if not await can_write_into(user, final_parent_id): raise HTTPException(403, "No access to this folder")
+    await get_or_create_folder(user.phone_number, final_parent_id, folder_name)
     return RedirectResponse(url=f"/dashboard?folder_id={final_parent_id}" if final_parent_id else "/dashboard", status_code=303)
 
 # --- COLLAB ROUTES ---
@@ -274,10 +434,9 @@ async def create_folder(request: Request, folder_name: str = Form(...), parent_i
 async def get_folder_team(request: Request, folder_id: str):
     user = await get_current_user(request)
     if not user: return JSONResponse({"error": "Auth required"}, 401)
-    folder = await FileSystemItem.get(folder_id)
+    folder = await FileSystemItem.get(folder_id) if ObjectId.is_valid(folder_id) else None
     if not folder: return JSONResponse({"error": "Not found"}, 404)
-    if folder.owner_phone != user.phone_number and user.phone_number not in folder.collaborators:
-        return JSONResponse({"error": "Unauthorized"}, 403)
+    if not await access.has_access(user.phone_number, folder): return JSONResponse({"error": "Unauthorized"}, 403)
     return JSONResponse({"collaborators": folder.collaborators, "owner": folder.owner_phone})
 
 @router.post("/folder/add_collaborator")
@@ -289,6 +448,8 @@ async def add_collaborator(request: Request, folder_id: str = Form(...), phone:
     if phone not in folder.collaborators:
         folder.collaborators.append(phone)
         await folder.save()
+        await access.grant(folder, phone)
+        invalidate_items([folder])
     return JSONResponse({"status": "success"})
 
 @router.post("/folder/remove_collaborator")
@@ -300,19 +461,12 @@ async def remove_collaborator(request: Request, folder_id: str = Form(...), phon
     if phone in folder.collaborators:
         folder.collaborators.remove(phone)
         await folder.save()
+        await access.revoke(folder, phone)
+        invalidate_items([folder])
+        listing_cache.invalidate(root_key(phone))
         return JSONResponse({"status": "success"})
     return JSONResponse({"error": "User not found"}, 404)
 
-@router.post("/share/bundle")
-async def create_bundle(request: Request, item_ids: List[str] = Body(...)):
-    user = await get_current_user(request)
-    if not user: return {"error": "Unauthorized"}
-    token = str(uuid.uuid4())
-    bundle = SharedCollection(token=token, item_ids=item_ids, owner_phone=user.phone_number, name=f"Shared by {user.first_name or 'User'}")
-    await bundle.insert()
-    base_url = str(request.base_url).rstrip("/")
-    return {"link": f"{base_url}/s/{token}"}
-
 @router.get("/profile")
 async def profile_page(request: Request):
     user = await get_current_user(request)
@@ -1,39 +1,25 @@
-import uuid
-from typing import List
-from fastapi import APIRouter, Request, HTTPException, Body
+from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse
-from fastapi.templating import Jinja2Templates
-from pyrogram import Client
 from beanie.operators import In
-from app.db.models import FileSystemItem, User, SharedCollection
-from app.core.config import settings
+from app.db.models import FileSystemItem, User, SharedCollection, to_object_ids
+from app.core.telegram_bot import user_client, connect_client, disconnect_client
+from app.core.metrics import instrument_stream
 from app.routes.stream import telegram_stream_generator
 from app.utils.file_utils import format_size, get_icon_for_mime
-from app.routes.dashboard import get_current_user
+from app.core.templates import templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
-
-@router.post("/share/bundle")
-async def create_bundle(request: Request, item_ids: List[str] = Body(...)):
-    user = await get_current_user(request)
-    if not user: return {"error": "Unauthorized"}
-    token = str(uuid.uuid4())
-    bundle = SharedCollection(token=token, item_ids=item_ids, owner_phone=user.phone_number, name=f"Shared by {user.first_name or 'User'}")
-    await bundle.insert()
-    base_url = str(request.base_url).rstrip("/")
-    return {"link": f"{base_url}/s/{token}"}
 
 @router.get("/s/{token}")
 async def public_view(request: Request, token: str):
     # Bundle Check
     collection = await SharedCollection.find_one(SharedCollection.token == token)
     if collection:
-        items = await FileSystemItem.find(In(FileSystemItem.id, collection.item_ids)).to_list()
+        items = await FileSystemItem.find(In(FileSystemItem.id, to_object_ids(collection.item_ids))).to_list()
         for item in items:
             item.formatted_size = format_size(item.size)
             item.icon = "fa-folder" if item.is_folder else get_icon_for_mime(item.mime_type)
-        return templates.TemplateResponse("shared_folder.html", {"request": request, "items": items, "bundle_name": collection.name})
+        return templates.TemplateResponse("shared_folder.html", {"request": request, "items": items, "bundle_name": collection.name, "token": token})
 
     # Single File Check
     item = await FileSystemItem.find_one(FileSystemItem.share_token == token)
@@ -44,14 +30,12 @@ async def public_view(request: Request, token: str):
 
     raise HTTPException(404, "Link expired")
 
-@router.get("/s/stream/file/{item_id}")
-async def public_stream_by_id(item_id: str):
-    item = await FileSystemItem.get(item_id)
-    if not item: raise HTTPException(404)
+async def stream_public(item: FileSystemItem):
+    if item.is_folder or not item.parts: raise HTTPException(404)
     owner = await User.find_one(User.phone_number == item.owner_phone)
-    
-    client = Client("pub_stream", api_id=settings.API_ID, api_hash=settings.API_HASH, session_string=owner.session_string, in_memory=True)
-    await client.connect()
+    if not owner: raise HTTPException(404, "Link expired")
+
+    client = await connect_client(user_client("pub_stream", owner.session_string))
 
     async def cleanup():
         try:
@@ -59,13 +43,22 @@ async def public_stream_by_id(item_id: str):
             async for chunk in telegram_stream_generator(client, msg_id, 0):
                 yield chunk
         finally:
-            await client.disconnect()
+            await disconnect_client(client)
 
     headers = {'Content-Disposition': f'inline; filename="{item.name}"', 'Content-Type': item.mime_type}
-    return StreamingResponse(cleanup(), headers=headers, media_type=item.mime_type)
+    return StreamingResponse(instrument_stream(cleanup(), "public"), headers=headers, media_type=item.mime_type)
+
+@router.get("/s/{token}/file/{item_id}")
+async def public_stream_bundle_item(token: str, item_id: str):
+    # Only items listed in the bundle behind this token are reachable.
+    collection = await SharedCollection.find_one(SharedCollection.token == token)
+    if not collection or item_id not in collection.item_ids: raise HTTPException(404)
+    item = await FileSystemItem.get(item_id)
+    if not item: raise HTTPException(404)
+    return await stream_public(item)
 
 @router.get("/s/stream/{token}")
 async def public_stream_token(token: str):
     item = await FileSystemItem.find_one(FileSystemItem.share_token == token)
     if not item: raise HTTPException(404)
-    return await public_stream_by_id(str(item.id))
\ No newline at end of file
+    return await stream_public(item)
\ No newline at end of file
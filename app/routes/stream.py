@@ -1,32 +1,69 @@
-import math
+import os
+import re
+from typing import Optional, Tuple
 from fastapi import APIRouter, Request, HTTPException, Header
-from fastapi.responses import StreamingResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import StreamingResponse, HTMLResponse, FileResponse, Response, JSONResponse
+from bson import ObjectId
 from pyrogram import Client
-from app.db.models import FileSystemItem, User
-from app.core.config import settings
+from app.db.models import FileSystemItem, KeyframeTable, User
+from app.core.telegram_bot import user_client, connect_client, disconnect_client
+from app.core.metrics import track_telegram, instrument_stream
+from app.core.transfer import iter_range, get_media, workload_for_range, SEQUENTIAL
+from app.core.templates import templates
+from app.core import hls, indexer, access
+from app.utils.media_index import keyframe_at
+from app.utils.ffmpeg_utils import ffmpeg_available
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+
+HLS_FILE_RE = re.compile(r"^(index\.m3u8|init\.mp4|seg_\d{5}\.m4s)$")
+HLS_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".mp4": "video/mp4", ".m4s": "video/iso.segment"}
 
 async def get_current_user(request: Request):
     phone = request.cookies.get("user_phone")
     if not phone: return None
     return await User.find_one(User.phone_number == phone)
 
-async def telegram_stream_generator(client: Client, message_id: int, offset: int):
+async def authorized_item(user: User, item_id: str) -> FileSystemItem:
+    item = await FileSystemItem.get(item_id) if ObjectId.is_valid(item_id) else None
+    if not item: raise HTTPException(404, "File not found")
+    if not await access.has_access(user.phone_number, item): raise HTTPException(403)
+    return item
+
+async def owner_session(item: FileSystemItem, user: User) -> str:
+    session = await access.owner_session(item.owner_phone, user)
+    if not session: raise HTTPException(404, "Owner account no longer exists")
+    return session
+
+def parse_range(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int, bool]]:
+    """Parses 'bytes=a-b', 'bytes=a-' and 'bytes=-n' into (start, end, explicit_end). None if unsatisfiable."""
+    start, end, explicit_end = 0, file_size - 1, False
+    if not range_header: return start, end, explicit_end
+    try:
+        start_str, end_str = range_header.replace("bytes=", "").split(",")[0].strip().split("-")
+        if not start_str:
+            start = max(file_size - int(end_str), 0)
+        else:
+            start = int(start_str)
+            if end_str:
+                end = min(int(end_str), file_size - 1)
+                explicit_end = True
+    except ValueError:
+        return 0, file_size - 1, False
+    if start > end: return None
+    return start, end, explicit_end
+
+async def telegram_stream_generator(client: Client, message_id: int, offset: int = 0, end: Optional[int] = None, workload: str = SEQUENTIAL):
     try:
         # Refresh File Reference
-        msg = await client.get_messages("me", message_ids=message_id)
-        
-        file_id = None
-        if msg.document: file_id = msg.document.file_id
-        elif msg.video: file_id = msg.video.file_id
-        elif msg.audio: file_id = msg.audio.file_id
-        elif msg.photo: file_id = msg.photo.file_id
-        else: yield b""; return
-
-        async for chunk in client.stream_media(file_id, offset=offset, limit=0):
+        with track_telegram("get_messages"):
+            msg = await client.get_messages("me", message_ids=message_id)
+
+        media = get_media(msg)
+        if not media: yield b""; return
+
+        last = media.file_size - 1 if end is None else end
+        async for chunk in iter_range(client, media, offset, last, workload):
             yield chunk
     except Exception as e:
         print(f"Stream Error: {e}")
@@ -40,13 +77,14 @@ async def player_page(request: Request, item_id: str):
     if not user: 
         return templates.TemplateResponse("login.html", {"request": request, "step": "phone"})
 
-    item = await FileSystemItem.get(item_id)
-    if not item: raise HTTPException(404, "File not found")
+    item = await authorized_item(user, item_id)
+    use_hls = ffmpeg_available() and (item.mime_type or "").startswith("video") and hls.worth_segmenting(item) and hls.can_serve(item_id)
 
     return templates.TemplateResponse("player.html", {
         "request": request,
         "item": item,
         "stream_url": f"/stream/data/{item_id}",
+        "hls_url": f"/stream/hls/{item_id}/index.m3u8" if use_hls else None,
         "user": user  # <--- FIX: This was missing! Now the navbar will show 'Profile'
     })
 
@@ -55,36 +93,76 @@ async def stream_data(request: Request, item_id: str, range: str = Header(None))
     user = await get_current_user(request)
     if not user: raise HTTPException(401)
 
-    item = await FileSystemItem.get(item_id)
-    if not item: raise HTTPException(404)
-
-    client = Client("streamer", api_id=settings.API_ID, api_hash=settings.API_HASH, session_string=user.session_string, in_memory=True)
-    await client.connect()
+    item = await authorized_item(user, item_id)
+    session = await owner_session(item, user)
 
     file_size = item.size
-    start = 0
-    end = file_size - 1
+    parsed = parse_range(range, file_size)
+    if parsed is None:
+        raise HTTPException(416, headers={"Content-Range": f"bytes */{file_size}"})
+    start, end, explicit_end = parsed
+    workload = workload_for_range(start, end, explicit_end)
 
-    if range:
+    headers = {
+        'Content-Range': f'bytes {start}-{end}/{file_size}',
+        'Accept-Ranges': 'bytes',
+        'Content-Length': str(end - start + 1),
+        'Content-Type': item.mime_type or "application/octet-stream",
+        'Content-Disposition': f'inline; filename="{item.name}"'
+    }
+
+    # Probes for the moov atom / MKV header are answered from the header cache.
+    if indexer.covers_header(item.media_index, start, end):
         try:
-            start_str = range.replace("bytes=", "").split("-")[0]
-            start = int(start_str) if start_str else 0
-        except ValueError: pass
+            header = await indexer.get_header(item, session)
+            offset = item.media_index.header_offset
+            return Response(header[start - offset:end - offset + 1], status_code=206 if range else 200, headers=headers)
+        except Exception as e:
+            print(f"Header cache error: {e}")
+
+    client = await connect_client(user_client("streamer", session))
 
     async def cleanup_generator():
         try:
             msg_id = item.parts[0].message_id
-            async for chunk in telegram_stream_generator(client, msg_id, start):
+            async for chunk in telegram_stream_generator(client, msg_id, start, end, workload):
                 yield chunk
         finally:
-            await client.disconnect()
+            await disconnect_client(client)
 
-    headers = {
-        'Content-Range': f'bytes {start}-{end}/{file_size}',
-        'Accept-Ranges': 'bytes',
-        'Content-Length': str(file_size - start),
-        'Content-Type': item.mime_type or "application/octet-stream",
-        'Content-Disposition': f'inline; filename="{item.name}"'
-    }
+    return StreamingResponse(instrument_stream(cleanup_generator(), "stream"), status_code=206 if range else 200, headers=headers, media_type=item.mime_type)
+
+@router.get("/stream/seek/{item_id}")
+async def stream_seek(request: Request, item_id: str, t: float = 0):
+    """Maps a playback time to the byte offset of the keyframe at or before it."""
+    user = await get_current_user(request)
+    if not user: raise HTTPException(401)
+    item = await authorized_item(user, item_id)
+    index = item.media_index
+    table = await KeyframeTable.get(item.id) if index and index.keyframe_count else None
+    if not table: return JSONResponse({"error": "Not indexed"}, 404)
+    kf_time, offset = keyframe_at(table.keyframes, t)
+    return JSONResponse({"time": kf_time, "offset": offset, "duration": index.duration, "faststart": index.faststart})
+
+# --- HLS ---
+@router.get("/stream/hls/{item_id}/{filename}")
+async def stream_hls(request: Request, item_id: str, filename: str):
+    user = await get_current_user(request)
+    if not user: raise HTTPException(401)
+    if not HLS_FILE_RE.match(filename) or not ObjectId.is_valid(item_id): raise HTTPException(404)
+    if not ffmpeg_available(): raise HTTPException(501, "HLS not available on this server")
+
+    item = await authorized_item(user, item_id)
+    if filename == hls.PLAYLIST:
+        if item.is_folder or not item.parts: raise HTTPException(404)
+        try: path = await hls.ensure_playlist(item, await owner_session(item, user))
+        except hls.HLSBusy as e: raise HTTPException(503, str(e))
+        except hls.HLSError as e: raise HTTPException(502, str(e))
+        # Event playlists grow while segmenting, so players must not cache them.
+        headers = {"Cache-Control": "no-cache"}
+    else:
+        path = os.path.join(hls.item_dir(item_id), filename)
+        if not os.path.exists(path): raise HTTPException(404)
+        headers = {"Cache-Control": "private, max-age=86400"}
 
-    return StreamingResponse(cleanup_generator(), status_code=206 if range else 200, headers=headers, media_type=item.mime_type)
\ No newline at end of file
+    return FileResponse(path, media_type=HLS_TYPES[os.path.splitext(filename)[1]], headers=headers)
@@ -0,0 +1,41 @@
+import asyncio
+from fastapi import APIRouter, Request, Response, HTTPException
+from fastapi.responses import JSONResponse
+from app.core.config import settings
+from app.core.metrics import render_metrics
+from app.core.telegram_bot import bot_started
+from app.db.models import User
+
+router = APIRouter()
+
+DB_PING_TIMEOUT = 2
+
+@router.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+@router.get("/readyz", include_in_schema=False)
+async def readyz(request: Request):
+    """
+    Readiness: MongoDB answers a ping. Requests are only served after startup has
+    initialised the DB, so this reports losing the DB later, not a slow start.
+    Telegram connects lazily so it is reported, not required.
+    """
+    try:
+        await asyncio.wait_for(User.get_pymongo_collection().database.command("ping"), DB_PING_TIMEOUT)
+        ready = True
+    except Exception:
+        ready = False
+    return JSONResponse({
+        "status": "ready" if ready else "db_unavailable",
+        "telegram_connected": bot_started(),
+        "startup_ms": getattr(request.app.state, "startup_ms", None),
+    }, status_code=200 if ready else 503)
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(401)
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
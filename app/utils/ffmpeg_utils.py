@@ -1,5 +1,51 @@
-# Placeholder for complex transcoding logic
-# Real implementation requires subprocess management with asyncio
+import os
+import json
+import shutil
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+def ffmpeg_available() -> bool:
+    return bool(shutil.which("ffmpeg") and shutil.which("ffprobe"))
+
+async def _run(*args) -> tuple:
+    proc = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        out, err = await proc.communicate()
+    except asyncio.CancelledError:
+        if proc.returncode is None: proc.kill()
+        raise
+    return proc.returncode, out, err
+
 async def get_video_duration(file_path):
-    # Logic to probe file
-    return 0
\ No newline at end of file
+    """Duration in seconds via ffprobe, 0 if unknown."""
+    code, out, _ = await _run("ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", file_path)
+    if code != 0: return 0
+    try: return float(json.loads(out)["format"]["duration"])
+    except (KeyError, ValueError, TypeError): return 0
+
+async def segment_hls(src: str, out_dir: str, segment_seconds: int = 6) -> bool:
+    """
+    Writes an HLS event playlist (index.m3u8) with fMP4 segments into out_dir.
+    src may be a path or a seekable http URL; segments appear while it is read.
+    Streams are remuxed without re-encoding when the codecs allow it; otherwise
+    it falls back to a fast H.264/AAC transcode.
+    """
+    common = [
+        "-f", "hls", "-hls_time", str(segment_seconds), "-hls_playlist_type", "event",
+        "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", "init.mp4",
+        "-hls_segment_filename", os.path.join(out_dir, "seg_%05d.m4s"),
+        os.path.join(out_dir, "index.m3u8"),
+    ]
+    base = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", src, "-map", "0:v:0", "-map", "0:a:0?"]
+
+    code, _, err = await _run(*base, "-c", "copy", *common)
+    if code == 0: return True
+    logger.info(f"HLS remux failed, transcoding instead: {err.decode(errors='ignore')[-300:]}")
+
+    for name in os.listdir(out_dir): os.remove(os.path.join(out_dir, name))
+    code, _, err = await _run(*base, "-c:v", "libx264", "-preset", "veryfast", "-c:a", "aac", *common)
+    if code != 0:
+        logger.error(f"HLS transcode failed: {err.decode(errors='ignore')[-300:]}")
+    return code == 0
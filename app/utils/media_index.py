@@ -0,0 +1,251 @@
+"""
+Container indexing for instant playback and seeking.
+
+Parses an MP4/MOV or Matroska/WebM file once and returns where its header
+(moov / everything before the first cluster) lives plus a keyframe table of
+(seconds, byte offset). Reads go through an async `read(offset, size)` callable,
+so the same code indexes a local temp file after upload or a Telegram-hosted
+file through small range requests.
+"""
+import struct
+from bisect import bisect_right
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import aiofiles
+
+from app.core.blocking import run_blocking
+
+Reader = Callable[[int, int], Awaitable[bytes]]
+
+MAX_HEADER = 32 * 1024 * 1024   # refuse absurd moov/cues sizes
+MAX_KEYFRAMES = 20000           # thin very dense tables to keep the Mongo doc small
+
+
+def file_reader(path: str) -> Reader:
+    async def read(offset: int, size: int) -> bytes:
+        async with aiofiles.open(path, "rb") as f:
+            await f.seek(offset)
+            return await f.read(size)
+    return read
+
+def _thin(keyframes: List[Tuple[float, int]]) -> List[Tuple[float, int]]:
+    if len(keyframes) <= MAX_KEYFRAMES: return keyframes
+    step = len(keyframes) / MAX_KEYFRAMES
+    return [keyframes[int(i * step)] for i in range(MAX_KEYFRAMES)]
+
+def keyframe_at(keyframes: List[Tuple[float, int]], seconds: float) -> Optional[Tuple[float, int]]:
+    """Last keyframe at or before `seconds`."""
+    if not keyframes: return None
+    i = bisect_right([k[0] for k in keyframes], seconds) - 1
+    return tuple(keyframes[max(i, 0)])
+
+
+# --- MP4 ---
+def _boxes(data: bytes, start: int = 0, end: Optional[int] = None):
+    """Iterates (type, payload_start, box_end) over sibling boxes in an in-memory buffer."""
+    pos, end = start, len(data) if end is None else end
+    while pos + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header: break
+        yield kind, pos + header, min(pos + size, end)
+        pos += size
+
+def _child(data: bytes, start: int, end: int, path: List[bytes]) -> Optional[Tuple[int, int]]:
+    for kind, s, e in _boxes(data, start, end):
+        if kind == path[0]:
+            return (s, e) if len(path) == 1 else _child(data, s, e, path[1:])
+    return None
+
+def _table(data: bytes, box: Tuple[int, int], fmt: str, header: int = 8) -> list:
+    """Reads a full-box table: version/flags, [extra], entry count, entries."""
+    s, _ = box
+    count = struct.unpack(">I", data[s + header - 4:s + header])[0]
+    width = struct.calcsize(fmt)
+    return [struct.unpack(fmt, data[s + header + i * width:s + header + (i + 1) * width]) for i in range(count)]
+
+def _parse_trak(moov: bytes, s: int, e: int):
+    hdlr = _child(moov, s, e, [b"mdia", b"hdlr"])
+    handler = moov[hdlr[0] + 8:hdlr[0] + 12] if hdlr else b""
+    mdhd = _child(moov, s, e, [b"mdia", b"mdhd"])
+    if not mdhd: return None
+    version = moov[mdhd[0]]
+    if version == 1: timescale, duration = struct.unpack(">IQ", moov[mdhd[0] + 20:mdhd[0] + 32])
+    else: timescale, duration = struct.unpack(">II", moov[mdhd[0] + 12:mdhd[0] + 20])
+    stbl = _child(moov, s, e, [b"mdia", b"minf", b"stbl"])
+    return handler, timescale, duration, stbl
+
+def _mp4_keyframes(moov: bytes, stbl: Tuple[int, int], timescale: int) -> List[Tuple[float, int]]:
+    s, e = stbl
+    find = lambda name: _child(moov, s, e, [name])
+    stts, stss, stsc, stsz = find(b"stts"), find(b"stss"), find(b"stsc"), find(b"stsz")
+    stco, co64 = find(b"stco"), find(b"co64")
+    if not (stts and stsc and stsz and (stco or co64)): return []
+
+    chunk_offsets = [c[0] for c in (_table(moov, stco, ">I") if stco else _table(moov, co64, ">Q"))]
+    uniform, count = struct.unpack(">II", moov[stsz[0] + 4:stsz[0] + 12])
+    sizes = [uniform] * count if uniform else [v[0] for v in _table(moov, stsz, ">I", header=12)]
+    sync = {v[0] for v in _table(moov, stss, ">I")} if stss else None
+
+    # Decode time of every sample (1-based sample numbers, like stss).
+    times, t = [], 0
+    for n, delta in _table(moov, stts, ">II"):
+        for _ in range(n):
+            times.append(t)
+            t += delta
+
+    keyframes = []
+    runs = _table(moov, stsc, ">III")
+    sample = 1
+    for i, (first_chunk, per_chunk, _) in enumerate(runs):
+        last_chunk = runs[i + 1][0] - 1 if i + 1 < len(runs) else len(chunk_offsets)
+        for chunk in range(first_chunk, last_chunk + 1):
+            offset = chunk_offsets[chunk - 1]
+            for _ in range(per_chunk):
+                if sample > len(sizes): break
+                if (sync is None or sample in sync) and sample <= len(times):
+                    keyframes.append((round(times[sample - 1] / timescale, 3), offset))
+                offset += sizes[sample - 1]
+                sample += 1
+    return keyframes
+
+def parse_moov(moov: bytes) -> Tuple[float, List[Tuple[float, int]]]:
+    """Returns (duration seconds, keyframes) from a complete moov payload."""
+    best = None
+    for kind, s, e in _boxes(moov):
+        if kind != b"trak": continue
+        track = _parse_trak(moov, s, e)
+        if not track or not track[3]: continue
+        if best is None or (track[0] == b"vide" and best[0] != b"vide"): best = track
+    if not best: return 0.0, []
+    handler, timescale, duration, stbl = best
+    if not timescale: return 0.0, []
+    return round(duration / timescale, 3), _thin(_mp4_keyframes(moov, stbl, timescale))
+
+async def index_mp4(read: Reader, file_size: int) -> Optional[dict]:
+    pos, moov_at, moov_end, mdat_at = 0, None, None, None
+    while pos + 8 <= file_size:
+        head = await read(pos, 16)
+        if len(head) < 8: break
+        size, kind = struct.unpack(">I4s", head[:8])
+        if size == 1: size = struct.unpack(">Q", head[8:16])[0]
+        elif size == 0: size = file_size - pos
+        if size < 8: break
+        if kind == b"moov": moov_at, moov_end = pos, pos + size
+        elif kind == b"mdat" and mdat_at is None: mdat_at = pos
+        elif kind == b"moof": break  # fragmented MP4: no global sample table
+        if moov_at is not None and mdat_at is not None: break
+        pos += size
+    if moov_at is None or moov_end - moov_at > MAX_HEADER: return None
+
+    moov = await read(moov_at, moov_end - moov_at)
+    duration, keyframes = await run_blocking(parse_moov, moov[8:] if moov[:4] != b"\x00\x00\x00\x01" else moov[16:])
+    return {
+        "container": "mp4", "faststart": mdat_at is None or moov_at < mdat_at,
+        "header_offset": moov_at, "header_size": moov_end - moov_at,
+        "duration": duration, "keyframes": keyframes,
+    }
+
+
+# --- MATROSKA / WEBM ---
+SEGMENT, SEEKHEAD, SEEK, SEEK_ID, SEEK_POS = 0x18538067, 0x114D9B74, 0x4DBB, 0x53AB, 0x53AC
+INFO, TIMECODE_SCALE, DURATION = 0x1549A966, 0x2AD7B1, 0x4489
+CUES, CUE_POINT, CUE_TIME, CUE_TRACK_POS, CUE_CLUSTER_POS = 0x1C53BB6B, 0xBB, 0xB3, 0xB7, 0xF1
+CLUSTER = 0x1F43B675
+
+def _vint(data: bytes, pos: int, keep_marker: bool) -> Tuple[int, int]:
+    first = data[pos]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)): length += 1
+    value = first if keep_marker else first & (0xFF >> length)
+    for b in data[pos + 1:pos + length]: value = (value << 8) | b
+    return value, length
+
+def _elements(data: bytes, start: int = 0, end: Optional[int] = None):
+    pos, end = start, len(data) if end is None else end
+    while pos < end:
+        try:
+            eid, n = _vint(data, pos, True)
+            size, m = _vint(data, pos + n, False)
+        except IndexError:
+            break
+        body = pos + n + m
+        yield eid, body, min(body + size, end)
+        pos = body + size
+
+def _uint(data: bytes, s: int, e: int) -> int:
+    return int.from_bytes(data[s:e], "big")
+
+async def index_mkv(read: Reader, file_size: int) -> Optional[dict]:
+    head = await read(0, 64 * 1024)
+    segment_start = None
+    for eid, s, _ in _elements(head):
+        if eid == SEGMENT: segment_start = s; break
+    if segment_start is None: return None
+
+    # Walk the top-level children of Segment until the first Cluster.
+    scale, duration, cues_at, cluster_at = 1_000_000, 0.0, None, None
+    pos = segment_start
+    while pos < file_size and cluster_at is None:
+        hdr = await read(pos, 16)
+        if len(hdr) < 2: break
+        eid, n = _vint(hdr, 0, True)
+        size, m = _vint(hdr, n, False)
+        body = pos + n + m
+        if eid == CLUSTER:
+            cluster_at = pos
+        elif eid in (SEEKHEAD, INFO) and size < MAX_HEADER:
+            data = await read(body, size)
+            if eid == INFO:
+                for cid, s, e in _elements(data):
+                    if cid == TIMECODE_SCALE: scale = _uint(data, s, e)
+                    elif cid == DURATION: duration = struct.unpack(">f" if e - s == 4 else ">d", data[s:e])[0]
+            else:
+                for cid, s, e in _elements(data):
+                    if cid != SEEK: continue
+                    target, where = None, None
+                    for sid, ss, se in _elements(data, s, e):
+                        if sid == SEEK_ID: target = _uint(data, ss, se)
+                        elif sid == SEEK_POS: where = _uint(data, ss, se)
+                    if target == CUES and where is not None: cues_at = segment_start + where
+        elif eid == CUES:
+            cues_at = pos
+        pos = body + size
+
+    keyframes = []
+    if cues_at is not None:
+        hdr = await read(cues_at, 16)
+        _, n = _vint(hdr, 0, True)
+        size, m = _vint(hdr, n, False)
+        if size < MAX_HEADER:
+            data = await read(cues_at + n + m, size)
+            for cid, s, e in _elements(data):
+                if cid != CUE_POINT: continue
+                t, where = None, None
+                for pid, ps, pe in _elements(data, s, e):
+                    if pid == CUE_TIME: t = _uint(data, ps, pe)
+                    elif pid == CUE_TRACK_POS:
+                        for qid, qs, qe in _elements(data, ps, pe):
+                            if qid == CUE_CLUSTER_POS: where = _uint(data, qs, qe)
+                if t is not None and where is not None:
+                    keyframes.append((round(t * scale / 1e9, 3), segment_start + where))
+
+    header_end = cluster_at or (cues_at or 0)
+    return {
+        "container": "mkv", "faststart": cues_at is None or cluster_at is None or cues_at < cluster_at,
+        "header_offset": 0, "header_size": header_end,
+        "duration": round(duration * scale / 1e9, 3), "keyframes": _thin(keyframes),
+    }
+
+
+async def build_index(read: Reader, file_size: int) -> Optional[dict]:
+    """Sniffs the container and indexes it; None when the format isn't supported."""
+    head = await read(0, 12)
+    if head[4:8] == b"ftyp": return await index_mp4(read, file_size)
+    if head[:4] == b"\x1a\x45\xdf\xa3": return await index_mkv(read, file_size)
+    return None
@@ -0,0 +1,212 @@
+"""
+Local stand-in for pyrogram.Client used by the benchmark harness.
+
+Only the surface the app actually touches is implemented. Media lives in a
+shared in-process store (message_id -> size) and bytes are synthesized on the
+fly, so multi-GB files cost no memory.
+"""
+import asyncio
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from pyrogram import raw
+from pyrogram.errors import FloodWait, LimitInvalid, OffsetInvalid
+from pyrogram.file_id import FileId, FileType
+
+PATTERN = random.Random(0).randbytes(1024 * 1024)  # 1 MiB of incompressible, repeatable data
+
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.05              # seconds of RTT added to every API call
+    chunk_size: int = 1024 * 1024      # bytes per streamed chunk
+    bandwidth: float = 0.0             # bytes/sec per stream, 0 = unlimited
+    connect_latency: float = 0.2       # seconds to "connect" a client
+    floodwait_rate: float = 0.0        # probability an API call hits FloodWait
+    floodwait_seconds: int = 1
+    sleep_threshold: int = 10          # FloodWaits below this are slept through, like pyrogram
+    stats: Dict[str, int] = field(default_factory=lambda: {"calls": 0, "floodwaits": 0, "connects": 0, "get_file": 0})
+
+
+class FakeStore:
+    config = FakeConfig()
+    media: Dict[int, int] = {}
+    blobs: Dict[int, bytes] = {}  # real content for the few files that need it (e.g. parsable MP4s)
+    next_id = 1
+
+    @classmethod
+    def add(cls, size: int, data: Optional[bytes] = None) -> int:
+        msg_id = cls.next_id
+        cls.next_id += 1
+        cls.media[msg_id] = size
+        if data is not None: cls.blobs[msg_id] = data
+        return msg_id
+
+    @classmethod
+    def read(cls, msg_id: int, offset: int, length: int) -> bytes:
+        blob = cls.blobs.get(msg_id)
+        return blob[offset:offset + length] if blob is not None else synth(offset, length)
+
+    @classmethod
+    def reset(cls, config: Optional[FakeConfig] = None):
+        cls.config = config or FakeConfig()
+        cls.media = {}
+        cls.blobs = {}
+        cls.next_id = 1
+
+
+def synth(offset: int, length: int) -> bytes:
+    start = offset % len(PATTERN)
+    out = PATTERN[start:start + length]
+    while len(out) < length:
+        out += PATTERN[:length - len(out)]
+    return out
+
+
+HOME_DC = 2
+
+def fake_file_id(msg_id: int) -> str:
+    # Real pyrogram encoding so app code can FileId.decode() it; media_id doubles as the message id.
+    return FileId(file_type=FileType.DOCUMENT, dc_id=HOME_DC, media_id=msg_id, access_hash=0, file_reference=b"").encode()
+
+
+@dataclass
+class FakeDocument:
+    file_id: str
+    file_size: int
+    file_unique_id: str = ""
+
+
+class FakeMessage:
+    def __init__(self, msg_id: int, size: Optional[int]):
+        self.id = msg_id
+        self.empty = size is None
+        self.document = FakeDocument(fake_file_id(msg_id), size) if size is not None else None
+        self.video = self.audio = self.photo = None
+
+
+class FakeUser:
+    first_name = "Bench"
+    username = "bench"
+
+
+class FakeStorage:
+    async def dc_id(self): return HOME_DC
+    async def test_mode(self): return False
+
+
+class Client:
+    def __init__(self, name, api_id=None, api_hash=None, session_string=None, bot_token=None, in_memory=False, **kwargs):
+        self.name = name
+        self.is_connected = False
+        self.me = FakeUser()
+        self.storage = FakeStorage()
+        self.media_sessions = {}
+        self.media_sessions_lock = asyncio.Lock()
+
+    # --- lifecycle ---
+    async def connect(self):
+        FakeStore.config.stats["connects"] += 1
+        await asyncio.sleep(FakeStore.config.connect_latency)
+        self.is_connected = True
+        return True
+
+    async def disconnect(self):
+        self.is_connected = False
+
+    async def start(self):
+        await self.connect()
+        return self
+
+    async def stop(self):
+        await self.disconnect()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    # --- helpers ---
+    async def _call(self):
+        cfg = FakeStore.config
+        cfg.stats["calls"] += 1
+        if cfg.floodwait_rate and random.random() < cfg.floodwait_rate:
+            cfg.stats["floodwaits"] += 1
+            if cfg.floodwait_seconds > cfg.sleep_threshold:
+                raise FloodWait(value=cfg.floodwait_seconds)
+            await asyncio.sleep(cfg.floodwait_seconds)
+        await asyncio.sleep(cfg.latency)
+
+    @staticmethod
+    def _msg_id(file_id) -> int:
+        if isinstance(file_id, FakeMessage): return file_id.id
+        return FileId.decode(file_id).media_id
+
+    async def invoke(self, query, sleep_threshold=None, **kwargs):
+        if not isinstance(query, raw.functions.upload.GetFile):
+            raise NotImplementedError(type(query).__name__)
+        # Enforce the real upload.getFile constraints so bad plans fail loudly.
+        offset, limit = query.offset, query.limit
+        if limit % 4096 or (1024 * 1024) % limit: raise LimitInvalid()
+        if offset % 4096 or offset // (1024 * 1024) != (offset + limit - 1) // (1024 * 1024): raise OffsetInvalid()
+        cfg = FakeStore.config
+        cfg.stats["get_file"] += 1
+        await self._call()
+        size = FakeStore.media[query.location.id]
+        n = max(min(limit, size - offset), 0)
+        if cfg.bandwidth: await asyncio.sleep(n / cfg.bandwidth)
+        return raw.types.upload.File(type=raw.types.storage.FileUnknown(), mtime=0, bytes=FakeStore.read(query.location.id, offset, n))
+
+    # --- API surface ---
+    async def get_me(self):
+        await self._call()
+        return FakeUser()
+
+    async def get_messages(self, chat_id, message_ids):
+        await self._call()
+        if isinstance(message_ids, (list, tuple)):
+            return [FakeMessage(m, FakeStore.media.get(m)) for m in message_ids]
+        return FakeMessage(message_ids, FakeStore.media.get(message_ids))
+
+    async def delete_messages(self, chat_id, message_ids):
+        await self._call()
+        ids = message_ids if isinstance(message_ids, (list, tuple)) else [message_ids]
+        for m in ids: FakeStore.media.pop(m, None)
+        return len(ids)
+
+    async def stream_media(self, message, limit: int = 0, offset: int = 0):
+        # Same semantics as pyrogram: offset/limit are counted in 1 MiB chunks.
+        cfg = FakeStore.config
+        size = FakeStore.media[self._msg_id(message)]
+        pos = offset * 1024 * 1024
+        sent = 0
+        while pos < size and (not limit or sent < limit):
+            await self._call()
+            n = min(cfg.chunk_size, size - pos)
+            if cfg.bandwidth: await asyncio.sleep(n / cfg.bandwidth)
+            yield FakeStore.read(self._msg_id(message), pos, n)
+            pos += n
+            sent += 1
+
+    async def download_media(self, message, file_name: str = "", **kwargs):
+        os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+        with open(file_name, "wb") as f:
+            async for chunk in self.stream_media(message):
+                f.write(chunk)
+        return file_name
+
+    async def send_document(self, chat_id, document, file_name=None, caption="", force_document=False, progress=None, **kwargs):
+        cfg = FakeStore.config
+        size = os.path.getsize(document)
+        done = 0
+        while done < size:
+            await self._call()
+            n = min(512 * 1024, size - done)  # pyrogram uploads in 512 KiB parts
+            if cfg.bandwidth: await asyncio.sleep(n / cfg.bandwidth)
+            done += n
+            if progress: await progress(done, size)
+        msg_id = FakeStore.add(size)
+        return FakeMessage(msg_id, size)
@@ -0,0 +1,249 @@
+"""
+Benchmark / load-test harness.
+
+Runs the real FastAPI app in-process against a fake Telegram backend
+(benchmarks/fake_telegram.py) and an in-memory Mongo (mongomock-motor),
+so streaming, upload, zip and dashboard numbers can be compared between
+commits without a Telegram account.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.run --scenarios stream,seek,upload,zip,dashboard --concurrency 8 --requests 32
+    python -m benchmarks.run --scenarios stream --latency 0.1 --bandwidth 20e6 --json bench.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import asyncio
+import argparse
+import tempfile
+import resource
+from typing import Callable, Dict, List
+
+# The app reads its settings at import time, so provide harmless defaults first.
+for key, value in {
+    "API_ID": "1", "API_HASH": "bench", "BOT_TOKEN": "1:bench",
+    "MONGO_URI": "mongodb://bench", "SECRET_KEY": "bench", "ADMIN_PHONE": "+10000000000",
+}.items():
+    os.environ.setdefault(key, value)
+
+import httpx
+import mongomock
+from mongomock_motor import AsyncMongoMockClient
+
+# Newer beanie/pymongo pass kwargs mongomock does not know about yet.
+_list_collection_names = mongomock.Database.list_collection_names
+mongomock.Database.list_collection_names = lambda self, *args, **kwargs: _list_collection_names(self, session=kwargs.get("session"))
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+mongomock.collection.BulkOperationBuilder.add_update = lambda self, *args, sort=None, **kwargs: _add_update(self, *args, **kwargs)
+
+from benchmarks import fake_telegram
+from benchmarks.fake_telegram import FakeConfig, FakeStore
+
+import app.core.telegram_bot as telegram_bot
+import app.db.models as models
+
+# --- WIRE FAKES IN ---
+telegram_bot.Client = fake_telegram.Client
+telegram_bot.tg_client = fake_telegram.Client("bench_bot")
+models.AsyncIOMotorClient = lambda *args, **kwargs: AsyncMongoMockClient()
+
+from main import app  # noqa: E402  (must come after the patches above)
+from app.db.models import User, FileSystemItem, FilePart  # noqa: E402
+
+PHONE = "+10000000001"
+MB = 1024 * 1024
+
+
+# --- SAMPLERS ---
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try: total += os.path.getsize(os.path.join(root, name))
+            except OSError: pass
+    return total
+
+class Sampler:
+    """Tracks peak RSS and peak temp-dir usage while a scenario runs."""
+    def __init__(self, tmp_dir: str, interval: float = 0.05):
+        self.tmp_dir = tmp_dir
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_tmp = 0
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, current_rss())
+            self.peak_tmp = max(self.peak_tmp, dir_size(self.tmp_dir))
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._loop())
+        return self
+
+    def __exit__(self, *args):
+        self._task.cancel()
+        self.peak_rss = max(self.peak_rss, current_rss())
+
+
+# --- SEEDING ---
+async def seed_file(name: str, size: int, parent_id=None) -> FileSystemItem:
+    msg_id = FakeStore.add(size)
+    item = FileSystemItem(
+        name=name, is_folder=False, parent_id=parent_id, owner_phone=PHONE, size=size,
+        mime_type="video/mp4", parts=[FilePart(telegram_file_id=fake_telegram.fake_file_id(msg_id), message_id=msg_id, part_number=1, size=size)]
+    )
+    await item.insert()
+    return item
+
+async def seed(args) -> Dict[str, object]:
+    await User(phone_number=PHONE, session_string="bench", first_name="Bench").insert()
+    video = await seed_file("bench.mp4", int(args.file_size * MB))
+    folder = FileSystemItem(name="bench_folder", is_folder=True, owner_phone=PHONE)
+    await folder.insert()
+    zip_ids = []
+    for i in range(args.zip_files):
+        zip_ids.append(str((await seed_file(f"part_{i}.bin", int(args.zip_file_size * MB), str(folder.id))).id))
+    for i in range(args.listing_size):
+        await FileSystemItem(name=f"dir_{i}", is_folder=True, parent_id=str(folder.id), owner_phone=PHONE).insert()
+    return {"video": video, "folder": folder, "zip_ids": zip_ids}
+
+
+# --- SCENARIOS ---
+def build_scenarios(args, seeded) -> Dict[str, Callable]:
+    video = seeded["video"]
+    payload = fake_telegram.synth(0, int(args.upload_size * MB))
+
+    async def stream(client):
+        return await client.get(f"/stream/data/{video.id}")
+
+    async def seek(client):
+        start = random.randrange(0, max(video.size - 65536, 1))
+        return await client.get(f"/stream/data/{video.id}", headers={"Range": f"bytes={start}-{start + 65535}"})
+
+    async def upload(client):
+        files = {"file": ("bench_upload.bin", payload, "application/octet-stream")}
+        return await client.post("/upload", files=files, data={"parent_id": str(seeded["folder"].id)})
+
+    async def zip_bundle(client):
+        return await client.post("/download/zip", json=seeded["zip_ids"])
+
+    async def dashboard(client):
+        return await client.get(f"/dashboard?folder_id={seeded['folder'].id}")
+
+    return {"stream": stream, "seek": seek, "upload": upload, "zip": zip_bundle, "dashboard": dashboard}
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values: return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+async def run_scenario(client, name: str, fn: Callable, total: int, concurrency: int, tmp_dir: str) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    body_bytes = 0
+    queue = iter(range(total))
+
+    async def worker():
+        nonlocal errors, body_bytes
+        for _ in queue:
+            start = time.perf_counter()
+            try:
+                resp = await fn(client)
+                body_bytes += len(resp.content)
+                if resp.status_code >= 400: errors += 1
+            except Exception as e:
+                print(f"[{name}] request failed: {e}", file=sys.stderr)
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with Sampler(tmp_dir) as sampler:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name, "requests": total, "concurrency": concurrency, "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "req_per_s": round(total / elapsed, 2) if elapsed else 0,
+        "mb_per_s": round(body_bytes / MB / elapsed, 2) if elapsed else 0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "peak_rss_mb": round(sampler.peak_rss / MB, 1),
+        "peak_tmp_mb": round(sampler.peak_tmp / MB, 1),
+    }
+
+def print_table(results: List[dict]):
+    cols = ["scenario", "requests", "concurrency", "errors", "req_per_s", "mb_per_s", "p50_ms", "p99_ms", "peak_rss_mb", "peak_tmp_mb"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in cols}
+    print("  ".join(c.ljust(widths[c]) for c in cols))
+    for r in results:
+        print("  ".join(str(r[c]).ljust(widths[c]) for c in cols))
+
+
+# --- ENTRYPOINT ---
+async def main(args):
+    FakeStore.reset(FakeConfig(
+        latency=args.latency, chunk_size=args.chunk_size, bandwidth=args.bandwidth,
+        connect_latency=args.connect_latency, floodwait_rate=args.floodwait_rate,
+        floodwait_seconds=args.floodwait_seconds,
+    ))
+    tmp_dir = tempfile.mkdtemp(prefix="mxm_bench_")
+    tempfile.tempdir = tmp_dir  # everything the app writes lands here so we can measure it
+
+    results = []
+    try:
+        lifespan_started = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            startup = time.perf_counter() - lifespan_started
+            seeded = await seed(args)
+            scenarios = build_scenarios(args, seeded)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", cookies={"user_phone": PHONE}, timeout=None) as client:
+                for name in args.scenarios.split(","):
+                    name = name.strip()
+                    if name not in scenarios:
+                        raise SystemExit(f"Unknown scenario '{name}'. Choose from: {', '.join(scenarios)}")
+                    results.append(await run_scenario(client, name, scenarios[name], args.requests, args.concurrency, tmp_dir))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"startup: {startup * 1000:.1f} ms | telegram calls: {FakeStore.config.stats}")
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"startup_ms": round(startup * 1000, 1), "results": results, "args": vars(args)}, f, indent=2)
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="MorganXMystic benchmark harness (fake Telegram backend)")
+    p.add_argument("--scenarios", default="stream,seek,upload,zip,dashboard")
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--requests", type=int, default=16, help="requests per scenario")
+    p.add_argument("--file-size", type=float, default=8, help="streamed file size (MiB)")
+    p.add_argument("--upload-size", type=float, default=4, help="uploaded file size (MiB)")
+    p.add_argument("--zip-files", type=int, default=4)
+    p.add_argument("--zip-file-size", type=float, default=2, help="size of each zipped file (MiB)")
+    p.add_argument("--listing-size", type=int, default=200, help="entries in the dashboard folder")
+    p.add_argument("--latency", type=float, default=0.02, help="fake Telegram RTT per call (s)")
+    p.add_argument("--connect-latency", type=float, default=0.1, help="fake client connect time (s)")
+    p.add_argument("--chunk-size", type=int, default=1024 * 1024, help="bytes per fake stream chunk")
+    p.add_argument("--bandwidth", type=float, default=0.0, help="bytes/s per stream, 0 = unlimited")
+    p.add_argument("--floodwait-rate", type=float, default=0.0, help="probability of FloodWait per call")
+    p.add_argument("--floodwait-seconds", type=int, default=1)
+    p.add_argument("--json", help="write results to this file")
+    return p.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
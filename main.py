@@ -1,24 +1,64 @@
 import os
+import time
+import asyncio
+import logging
+
+PROCESS_START = time.perf_counter()
+
 import uvicorn
 from fastapi import FastAPI, Response
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.core.telegram_bot import start_telegram, stop_telegram
+from app.core.telegram_bot import get_bot, stop_telegram
+from app.core.templates import precompile_templates
+from app.core.metrics import MetricsMiddleware, STARTUP_SECONDS
+from app.core import scrubber, blocking
 from app.db.models import init_db
-from app.routes import auth, dashboard, stream, admin, share
+from app.routes import auth, dashboard, stream, admin, share, system
+
+logger = logging.getLogger(__name__)
+IMPORTS_DONE = time.perf_counter()
+
+async def timed_phase(phase: str, coro):
+    start = time.perf_counter()
+    result = await coro
+    STARTUP_SECONDS.labels(phase).set(time.perf_counter() - start)
+    return result
+
+async def warmup_telegram():
+    try: await timed_phase("telegram", get_bot())
+    except Exception as e: logger.warning(f"Telegram warm-up failed, will retry on first use: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Connect to DB and Start Telegram Client
-    await init_db()
-    await start_telegram()
+    # Startup: DB init and template compilation run concurrently. The Telegram
+    # client is connected lazily on first use (or warmed up in the background),
+    # so it never delays readiness. Uvicorn only serves once this returns.
+    blocking.start_monitor()
+    lifespan_start = time.perf_counter()
+    warmup = asyncio.create_task(warmup_telegram()) if settings.TELEGRAM_WARMUP else None
+    await asyncio.gather(
+        timed_phase("db", init_db()),
+        timed_phase("templates", asyncio.to_thread(precompile_templates)),
+    )
+    now = time.perf_counter()
+    phases = {"imports": IMPORTS_DONE - PROCESS_START, "lifespan": now - lifespan_start, "total": now - PROCESS_START}
+    for phase, seconds in phases.items():
+        STARTUP_SECONDS.labels(phase).set(seconds)
+    app.state.startup_ms = {phase: round(seconds * 1000, 1) for phase, seconds in phases.items()}
+    logger.info(f"Startup complete: {app.state.startup_ms}")
+    scrubber.start()
     yield
-    # Shutdown: Stop Telegram Client
+    # Shutdown: Stop Telegram Client (no-op if it was never used)
+    if warmup: warmup.cancel()
+    scrubber.stop()
+    blocking.stop_monitor()
     await stop_telegram()
 
 app = FastAPI(title="MORGANXMYSTIC Storage", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 # --- FIX: Auto-Create Static Directory ---
 # This prevents the "RuntimeError: Directory 'app/static' does not exist" on Koyeb
@@ -40,6 +80,7 @@ app.include_router(dashboard.router)
 app.include_router(stream.router)
 app.include_router(admin.router)
 app.include_router(share.router)
+app.include_router(system.router)
 
 if __name__ == "__main__":
     # Reload=True allows the server to restart when you edit code